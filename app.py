@@ -1,6 +1,6 @@
 import streamlit as st
 import pandas as pd
-from query_functions import query_handling_using_LLM_updated
+from query_functions import query_handling_stream, warm_up, warmup
 
 st.set_page_config(page_title="SHL Assessment Recommendation System", layout="centered")
 
@@ -13,84 +13,105 @@ st.markdown(
     unsafe_allow_html=True
 )
 
+# Models and catalog load once per Streamlit process, with per-stage timings
+@st.cache_resource(show_spinner="⏳ Loading models and catalog...")
+def load_service():
+    warm_up()
+    return warmup.stats()
+
+load_service()
+
 query = st.text_input("🔍 Enter your search query here:", placeholder="e.g. Python SQL coding test")
 
+STAGE_LABELS = {
+    "raw": "⚡ Quick matches for your query (refining with AI...)",
+    "refined": "✅ Here are your top assessment recommendations:"
+}
+
+
+def results_table_html(df: pd.DataFrame) -> str:
+    if 'Score' in df.columns:
+        df = df.drop(columns=['Score'])
+
+    if "Duration" in df.columns:
+        df = df.rename(columns={"Duration": "Duration in mins"})
+
+    display_cols = ["Assessment Name", "Skills", "Test Type", "Description", "Remote Testing Support", "Adaptive/IRT", "Duration in mins", "URL"]
+    df = df[[col for col in display_cols if col in df.columns]].copy()
+
+    # Make URLs clickable
+    df['URL'] = df['URL'].apply(lambda x: f"<a href='{x}' target='_blank'>🔗 View</a>" if pd.notna(x) else "")
+
+    # Build styled HTML table
+    table_html = """
+    <style>
+        table.custom-table {
+            width: 100%;
+            border-collapse: collapse;
+            font-family: Arial, sans-serif;
+        }
+        table.custom-table thead {
+            background-color: #2e2e2e;
+            color: white;
+        }
+        table.custom-table th, table.custom-table td {
+            border: 1px solid #444;
+            padding: 10px;
+            text-align: left;
+            vertical-align: top;
+            color: #eee;
+        }
+        table.custom-table tr:nth-child(even) {
+            background-color: #1e1e1e;
+        }
+        table.custom-table tr:nth-child(odd) {
+            background-color: #2a2a2a;
+        }
+        a {
+            color: #1a73e8;
+            text-decoration: none;
+        }
+    </style>
+    <table class="custom-table">
+        <thead>
+            <tr>
+    """
+
+    for col in df.columns:
+        table_html += f"<th>{col}</th>"
+    table_html += "</tr></thead><tbody>"
+
+    for _, row in df.iterrows():
+        table_html += "<tr>"
+        for cell in row:
+            table_html += f"<td>{cell}</td>"
+        table_html += "</tr>"
+
+    table_html += "</tbody></table>"
+    return table_html
+
+
 # On search
 if st.button("Search"):
     if query.strip() == "":
         st.warning("Please enter a valid query.")
     else:
-        with st.spinner("🤖 Thinking... Fetching the best matches for you!"):
-            try:
-                # Get results
-                df = query_handling_using_LLM_updated(query)
-
-                if isinstance(df, pd.DataFrame) and not df.empty:
-                    if 'Score' in df.columns:
-                        df = df.drop(columns=['Score'])
-
-                    if "Duration" in df.columns:
-                        df = df.rename(columns={"Duration": "Duration in mins"})
-
-                    display_cols = ["Assessment Name", "Skills", "Test Type", "Description", "Remote Testing Support", "Adaptive/IRT", "Duration in mins", "URL"]
-                    df = df[[col for col in display_cols if col in df.columns]]
-
-                    # Make URLs clickable
-                    df['URL'] = df['URL'].apply(lambda x: f"<a href='{x}' target='_blank'>🔗 View</a>" if pd.notna(x) else "")
-
-                    st.success("✅ Here are your top assessment recommendations:")
-
-                    # Build styled HTML table
-                    table_html = """
-                    <style>
-                        table.custom-table {
-                            width: 100%;
-                            border-collapse: collapse;
-                            font-family: Arial, sans-serif;
-                        }
-                        table.custom-table thead {
-                            background-color: #2e2e2e;
-                            color: white;
-                        }
-                        table.custom-table th, table.custom-table td {
-                            border: 1px solid #444;
-                            padding: 10px;
-                            text-align: left;
-                            vertical-align: top;
-                            color: #eee;
-                        }
-                        table.custom-table tr:nth-child(even) {
-                            background-color: #1e1e1e;
-                        }
-                        table.custom-table tr:nth-child(odd) {
-                            background-color: #2a2a2a;
-                        }
-                        a {
-                            color: #1a73e8;
-                            text-decoration: none;
-                        }
-                    </style>
-                    <table class="custom-table">
-                        <thead>
-                            <tr>
-                    """
-
-                    for col in df.columns:
-                        table_html += f"<th>{col}</th>"
-                    table_html += "</tr></thead><tbody>"
-
-                    for _, row in df.iterrows():
-                        table_html += "<tr>"
-                        for cell in row:
-                            table_html += f"<td>{cell}</td>"
-                        table_html += "</tr>"
-
-                    table_html += "</tbody></table>"
-
-                    st.markdown(table_html, unsafe_allow_html=True)
-
-                else:
-                    st.warning("😕 No assessments matched your query. Try rephrasing it!")
-
-            except Exception as e:
-                st.error(f"🚨 Something went wrong: {e}")
\ No newline at end of file
+        # Raw-query matches show up immediately and are replaced once the AI-refined results arrive
+        status = st.empty()
+        table = st.empty()
+        shown = None
+        try:
+            with st.spinner("🤖 Thinking... Fetching the best matches for you!"):
+                for stage, df in query_handling_stream(query):
+                    if isinstance(df, pd.DataFrame) and not df.empty:
+                        status.success(STAGE_LABELS.get(stage, stage))
+                        table.markdown(results_table_html(df), unsafe_allow_html=True)
+                        shown = stage
+
+            if shown is None:
+                st.warning("😕 No assessments matched your query. Try rephrasing it!")
+            elif shown == "raw":
+                status.info("ℹ️ Showing quick matches (AI refinement unavailable).")
+
+        except Exception as e:
+            st.error(f"🚨 Something went wrong: {e}")
@@ -0,0 +1,16 @@
+import os
+
+# Load the model, catalog and indexes once in the master, then fork: workers share those
+# pages copy-on-write instead of each holding its own copy
+os.environ.setdefault("PRELOAD_MODELS", "1")
+preload_app = True
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+# Exported so each worker sizes its torch thread pool to its share of the cores (src/inference.py);
+# set the worker count here rather than with -w for the same reason
+os.environ.setdefault("WEB_CONCURRENCY", "2")
+workers = int(os.environ["WEB_CONCURRENCY"])
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Model loading happens before the fork, so workers boot fast; keep generous for first-query warm-up
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
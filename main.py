@@ -1,94 +1,371 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import RedirectResponse
+import time
+BOOT_START = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import RedirectResponse, Response, StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 import pandas as pd
-from query_functions import query_handling_using_LLM_updated  
-from sentence_transformers import SentenceTransformer
+from query_functions import search_catalog_batch, rewrite_cache, build_rewrite_prompt, rewrite_cache_key, merge_hits
+import io
 import os
-import torch
-import google.generativeai as genai
+import json
+import asyncio
 from dotenv import load_dotenv
+from src.embeddings import get_corpus_embeddings, get_index, load_model, catalog_metadata, query_embedding_cache, MODEL_NAME
+from src.batching import MicroBatcher
+from src.inference import InferencePool, QueueFullError
+from src.metrics import registry, timed, request_timings, server_timing
+from src.filters import FilterIndex
+from src.catalog import CatalogRecords
+from src.lexical import load_lexical_index, RETRIEVAL_MODE
+from src.rerank import CrossEncoderReranker, RERANK_ENABLED, RERANK_TOP_N
+from src.encoders import load_checked_encoder, ENCODER_BACKEND
+from src.snapshot import CatalogSnapshot, SnapshotManager, read_catalog_file
+from src.llm import AsyncLLMClient, GeminiBackend, HTTPStubBackend, CircuitBreaker, LLMTimeoutError, LLMUnavailableError, LLM_STUB_URL, GEMINI_MODEL_NAME
+from src.warmup import WarmupTracker
+import threading
+import gc
+from src.memory import process_memory
+
+# Boot stages (imports, model, catalog, ...) and the readiness flag behind /ready
+boot = WarmupTracker("api")
+boot.record("import", (time.perf_counter() - BOOT_START) * 1000)
+
+# Warm up in a background thread so /health answers while models load (WARMUP_IN_BACKGROUND=0 blocks startup instead)
+WARMUP_IN_BACKGROUND = os.getenv("WARMUP_IN_BACKGROUND", "1") == "1"
+
+# Load model + catalog at import, before the server forks workers (set by gunicorn.conf.py)
+PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "0") == "1"
+preloaded = False
 
 app = FastAPI()
 
+# Add a Server-Timing header (per-stage durations) to every response; stage histograms are always on
+SERVER_TIMING = os.getenv("SERVER_TIMING", "0") == "1"
+
+http_requests = registry.counter("http_requests_total", "HTTP requests by route and status")
+http_latency = {}
+route_paths = None
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    global route_paths
+    if route_paths is None:
+        route_paths = {route.path for route in app.routes}
+    # Unknown paths share one label so scanners cannot blow up the series count
+    path = request.url.path if request.url.path in route_paths else "other"
+
+    timings = {}
+    token = request_timings.set(timings)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    except Exception:
+        http_requests.inc(path=path, status=500)
+        raise
+    finally:
+        request_timings.reset(token)
+
+    total = (time.perf_counter() - start) * 1000
+    http_requests.inc(path=path, status=response.status_code)
+    if path not in http_latency:
+        http_latency[path] = registry.histogram("http_request_duration_ms", "Request latency by route", path=path)
+    http_latency[path].observe(total)
+
+    if SERVER_TIMING:
+        response.headers["Server-Timing"] = server_timing({**timings, "total": total})
+    return response
+
 # Global objects to be initialized on startup
 model = None
+query_encoder = None
 gemini_model = None
-catalog_df = None
-corpus = None
-corpus_embeddings = None
+reranker = None
+llm_client = None
 
+# Results per response; first-stage depth grows to RERANK_TOP_N when the cross-encoder is on
+TOP_K = 10
+SEARCH_K = max(TOP_K, RERANK_TOP_N) if RERANK_ENABLED else TOP_K
 
-@app.on_event("startup")
-def startup_event():
-    global model, gemini_model, catalog_df, corpus, corpus_embeddings
+# With the reranker on, LLM_REWRITE=0 skips Gemini and relies on the reranker instead
+LLM_REWRITE_ENABLED = os.getenv("LLM_REWRITE", "1") == "1"
 
-    load_dotenv()
-    api_key = os.getenv("GOOGLE_API_KEY")
+# Coalesce concurrent /recommend calls into one encode + search (set RECOMMEND_BATCHING=0 to disable)
+BATCHING_ENABLED = os.getenv("RECOMMEND_BATCHING", "1") == "1"
+
+
+def search_batch(snapshot, queries, masks=None):
+    # -> one (indices, scores) pair per query
+    return search_catalog_batch(
+        queries,
+        k=SEARCH_K,
+        model=query_encoder,
+        corpus_embeddings=snapshot.corpus_embeddings,
+        corpus_index=snapshot.corpus_index,
+        masks=masks,
+        lexical_index=snapshot.lexical_index
+    )
+
+
+def search_batch_items(items):
+    # Micro-batcher items are (snapshot, query, eligibility mask or None); a batch
+    # straddling a reload is split so every query is searched in its own snapshot
+    results = [None] * len(items)
+    groups = {}
+    for i, (snapshot, _, _) in enumerate(items):
+        groups.setdefault(id(snapshot), (snapshot, []))[1].append(i)
+    for snapshot, positions in groups.values():
+        hits = search_batch(snapshot, [items[i][1] for i in positions], [items[i][2] for i in positions])
+        for i, hit in zip(positions, hits):
+            results[i] = hit
+    return results
+
+
+# Encode / search / rerank run on these threads only (bounded backlog, fixed torch threads),
+# so the event loop never blocks on them and bursts queue instead of oversubscribing cores
+inference_pool = InferencePool(name="inference")
+
+
+def run_batch_items(items):
+    # The batcher waits for a free inference thread, so batches grow while the pool is busy
+    return inference_pool.submit(search_batch_items, items, block=True).result()
+
+
+recommend_batcher = MicroBatcher(run_batch_items, name="recommend-batcher")
+
+
+def overloaded() -> bool:
+    return inference_pool.full() or (BATCHING_ENABLED and recommend_batcher.full())
+
+
+def busy_error(e=None):
+    # Fast rejection under overload; clients retry instead of piling onto the queue
+    detail = str(e) if e else "Server busy. Retry shortly."
+    return HTTPException(status_code=429, detail=detail, headers={"Retry-After": "1"})
+
+# How often an in-flight request checks whether its client has disconnected
+DISCONNECT_POLL_SECONDS = 0.1
+
+# Latency budget for the Gemini rewrite. When > 0, retrieval on the raw query runs in parallel
+# and is served if the rewrite misses the deadline (0 = always wait for the rewrite)
+LLM_DEADLINE_MS = float(os.getenv("LLM_DEADLINE_MS", "0"))
+# Merge raw-query and rewritten-query hits when the rewrite arrives in time (0 = rewrite only)
+LLM_MERGE_RESULTS = os.getenv("LLM_MERGE_RESULTS", "1") == "1"
+
+fallback_stats = {"raw_only": 0, "rewritten": 0, "deadline_missed": 0, "llm_unavailable": 0}
+
+
+# Use the processed catalog when it exists, otherwise the old export format
+CATALOG_PATH = "data/processed/shl_catalog_clean.csv"
+if not os.path.exists(CATALOG_PATH):
+    CATALOG_PATH = "SHL_catalog.csv"
+
+# Reloads through POST /admin/reload need this token in the X-Admin-Token header (unset = endpoint disabled)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+
+def build_corpus(catalog_df):
+    # Check which columns exist and create combined text accordingly
+    if "combined_text" in catalog_df.columns:
+        # Already has combined_text (missing texts as "", like load_embeddings, so both hash the same)
+        return catalog_df["combined_text"].fillna("").tolist()
+
+    # Need to create combined text from individual columns
+    def combine_row(row):
+        parts = []
+        if "Assessment Name" in catalog_df.columns:
+            parts.append(str(row.get("Assessment Name", "")))
+        elif "assessment_name" in catalog_df.columns:
+            parts.append(str(row.get("assessment_name", "")))
+
+        if "Duration" in catalog_df.columns:
+            parts.append(str(row.get("Duration", "")))
+        if "Remote Testing Support" in catalog_df.columns:
+            parts.append(str(row.get("Remote Testing Support", "")))
+        elif "remote_testing_support" in catalog_df.columns:
+            parts.append(str(row.get("remote_testing_support", "")))
+        if "Adaptive/IRT" in catalog_df.columns:
+            parts.append(str(row.get("Adaptive/IRT", "")))
+        elif "adaptive_irt" in catalog_df.columns:
+            parts.append(str(row.get("adaptive_irt", "")))
+        if "Test Type" in catalog_df.columns:
+            parts.append(str(row.get("Test Type", "")))
+        elif "test_type" in catalog_df.columns:
+            parts.append(str(row.get("test_type", "")))
+        if "Skills" in catalog_df.columns:
+            parts.append(str(row.get("Skills", "")))
+        if "Description" in catalog_df.columns:
+            parts.append(str(row.get("Description", "")))
+        return ' '.join(parts)
+
+    catalog_df['combined'] = catalog_df.apply(combine_row, axis=1)
+    return catalog_df['combined'].tolist()
+
+
+def load_catalog_snapshot():
+    """
+    Build every catalog-derived structure for the catalog currently on disk
+    """
+    raw, version = read_catalog_file(CATALOG_PATH)
+    catalog_df = pd.read_csv(io.BytesIO(raw))
+    corpus = build_corpus(catalog_df)
+
+    # Load embeddings from the shared store (only new / changed rows are re-encoded, matched by catalog id)
+    corpus_embeddings = get_corpus_embeddings(corpus, model=model, metadata=catalog_metadata(catalog_df))
+    corpus_index = get_index(corpus_embeddings)
+
+    # BM25 index for hybrid lexical + dense retrieval (RETRIEVAL_MODE=dense turns it off)
+    lexical_index = load_lexical_index(corpus) if RETRIEVAL_MODE == "hybrid" else None
+
+    return CatalogSnapshot(
+        version=version,
+        catalog_path=CATALOG_PATH,
+        catalog_df=catalog_df,
+        corpus=corpus,
+        corpus_embeddings=corpus_embeddings,
+        corpus_index=corpus_index,
+        lexical_index=lexical_index,
+        # Precomputed boolean indexes for structured constraints
+        catalog_filters=FilterIndex(catalog_df),
+        # Column-normalised, validated and pre-serialised response records
+        catalog_records=CatalogRecords(catalog_df, validate=Assessment)
+    )
+
+
+def warm_snapshot(snapshot):
+    # Touch the mapped vectors and index once so the first request after a swap is not the slow one.
+    # The encode runs on an inference thread like every other model call, so it shares the pool's
+    # torch settings and bound instead of competing with live traffic from the reload thread.
+    # Before the pool is started (initial load, gunicorn master) the first_query stage warms up instead.
+    if query_encoder is not None and inference_pool.running:
+        inference_pool.submit(search_batch, snapshot, ["warm-up"], block=True).result()
+
+
+# The live snapshot; a watcher (RELOAD_POLL_SECONDS) or POST /admin/reload swaps it without a restart
+snapshots = SnapshotManager(load_catalog_snapshot, warm_fn=warm_snapshot, watch_path=CATALOG_PATH)
+
+
+def load_shared_state():
+    """
+    Read-only state: model weights, catalog snapshot, query encoder, reranker.
+    With PRELOAD_MODELS=1 this runs once in the gunicorn master and is shared by every forked worker.
+    """
+    global model, query_encoder, reranker
 
     print("🚀 Loading models and data...")
 
     # Load Sentence Transformer model FIRST
-    model = SentenceTransformer('all-MiniLM-L6-v2')
+    with boot.stage("model"):
+        model = load_model(MODEL_NAME)
+
+    # Catalog, embeddings and indexes live in a swappable snapshot (see load_catalog_snapshot)
+    with boot.stage("catalog_snapshot"):
+        snapshot, _ = snapshots.reload()
+
+    # Queries may use a quantized / ONNX encoder; it is rejected (torch fallback) if it drifts from the stored vectors
+    with boot.stage("query_encoder"):
+        query_encoder = load_checked_encoder(snapshot.corpus, snapshot.corpus_embeddings, backend=ENCODER_BACKEND, base_model=model)
+
+    if RERANK_ENABLED:
+        with boot.stage("reranker"):
+            reranker = CrossEncoderReranker()
+
+
+def start_worker_services():
+    """
+    Per-process pieces that must not cross a fork: LLM client, threads, first inference
+    """
+    global gemini_model, llm_client
+
+    # Inference threads + torch thread settings (restores multi-threading after a preloaded fork)
+    inference_pool.start()
+
+    load_dotenv()
+    api_key = os.getenv("GOOGLE_API_KEY")
 
     # Load Gemini
-    genai.configure(api_key=api_key)
-    gemini_model = genai.GenerativeModel("gemini-2.5-flash")
-
-    # Load and process catalog data
-    # Use the processed catalog (check which file exists)
-    catalog_path = "data/processed/shl_catalog_clean.csv"
-    if not os.path.exists(catalog_path):
-        # Fallback to old format if processed doesn't exist
-        catalog_path = "SHL_catalog.csv"
-    
-    catalog_df = pd.read_csv(catalog_path)
+    with boot.stage("llm"):
+        import google.generativeai as genai
 
-    # Check which columns exist and create combined text accordingly
-    if "combined_text" in catalog_df.columns:
-        # Already has combined_text
-        corpus = catalog_df["combined_text"].tolist()
+        genai.configure(api_key=api_key)
+        gemini_model = genai.GenerativeModel(GEMINI_MODEL_NAME)
+
+        # Async rewriter (bounded concurrency + timeout); LLM_STUB_URL swaps in a local stub server
+        backend = HTTPStubBackend(LLM_STUB_URL) if LLM_STUB_URL else GeminiBackend(gemini_model)
+        llm_client = AsyncLLMClient(
+            backend,
+            prompt_fn=build_rewrite_prompt,
+            cache=rewrite_cache,
+            key_fn=rewrite_cache_key,
+            breaker=CircuitBreaker()
+        )
+
+    with boot.stage("first_query"):
+        warm_snapshot(snapshots.current)
+
+    if BATCHING_ENABLED:
+        recommend_batcher.start()
+
+    snapshots.start_watcher()
+
+
+def run_warm_up():
+    try:
+        if not preloaded:
+            load_shared_state()
+        start_worker_services()
+    except Exception as e:
+        boot.mark_failed(e)
+        raise
+    boot.mark_ready()
+
+
+def preload():
+    """
+    Load the shared state before gunicorn forks (see gunicorn.conf.py). Objects created
+    so far are moved out of the GC's reach so collections in the workers do not
+    write to, and thereby un-share, their pages.
+    """
+    global preloaded
+    import torch
+
+    # Single-threaded in the master: an OpenMP pool started before fork can hang the children
+    torch.set_num_threads(1)
+
+    load_shared_state()
+    gc.collect()
+    gc.freeze()
+    preloaded = True
+
+
+@app.on_event("startup")
+def startup_event():
+    if WARMUP_IN_BACKGROUND and not preloaded:
+        threading.Thread(target=run_warm_up, name="warm-up", daemon=True).start()
     else:
-        # Need to create combined text from individual columns
-        def combine_row(row):
-            parts = []
-            if "Assessment Name" in catalog_df.columns:
-                parts.append(str(row.get("Assessment Name", "")))
-            elif "assessment_name" in catalog_df.columns:
-                parts.append(str(row.get("assessment_name", "")))
-            
-            if "Duration" in catalog_df.columns:
-                parts.append(str(row.get("Duration", "")))
-            if "Remote Testing Support" in catalog_df.columns:
-                parts.append(str(row.get("Remote Testing Support", "")))
-            elif "remote_testing_support" in catalog_df.columns:
-                parts.append(str(row.get("remote_testing_support", "")))
-            if "Adaptive/IRT" in catalog_df.columns:
-                parts.append(str(row.get("Adaptive/IRT", "")))
-            elif "adaptive_irt" in catalog_df.columns:
-                parts.append(str(row.get("adaptive_irt", "")))
-            if "Test Type" in catalog_df.columns:
-                parts.append(str(row.get("Test Type", "")))
-            elif "test_type" in catalog_df.columns:
-                parts.append(str(row.get("test_type", "")))
-            if "Skills" in catalog_df.columns:
-                parts.append(str(row.get("Skills", "")))
-            if "Description" in catalog_df.columns:
-                parts.append(str(row.get("Description", "")))
-            return ' '.join(parts)
-
-        catalog_df['combined'] = catalog_df.apply(combine_row, axis=1)
-        corpus = catalog_df['combined'].tolist()
-
-    # Now create embeddings AFTER model is loaded
-    corpus_embeddings = model.encode(corpus, convert_to_tensor=True)
-
-    print("✅ Startup complete.")
+        run_warm_up()
+
+
+@app.on_event("shutdown")
+def shutdown_event():
+    snapshots.stop_watcher()
+    recommend_batcher.stop()
+    inference_pool.shutdown()
 
 @app.get("/health")
-def health_check():
+async def health_check():
+    # Liveness: the process is up, whether or not warm-up has finished
     return {"status": "healthy"}
+
+
+@app.get("/ready")
+async def readiness_check():
+    # Readiness: every warm-up stage done; 503 (with the stage timings so far) until then
+    if not boot.ready:
+        raise HTTPException(status_code=503, detail=boot.stats())
+    return {"status": "ready", **boot.stats()}
     
 @app.get("/")
 def root():
@@ -101,13 +378,33 @@ def info():
         "status": "running",
         "endpoints": {
             "health": "/health",
+            "ready": "/ready",
             "recommend": "/recommend (POST)",
+            "recommend_stream": "/recommend/stream (POST, NDJSON or SSE)",
+            "recommend_batch": "/recommend/batch (POST)",
+            "batching_stats": "/stats/batching",
+            "cache_stats": "/stats/cache",
+            "llm_stats": "/stats/llm",
+            "rerank_stats": "/stats/rerank",
+            "memory_stats": "/stats/memory",
+            "inference_stats": "/stats/inference",
+            "metrics": "/metrics",
+            "snapshot": "/admin/snapshot",
+            "reload": "/admin/reload (POST)",
             "docs": "/docs"
         }
     }
 
+# Structured constraints, applied exactly before scoring
+class RecommendFilters(BaseModel):
+    remote: Optional[bool] = None
+    adaptive: Optional[bool] = None
+    test_types: Optional[List[str]] = None  # key letters ("P") or names ("Personality & Behavior"), any-of
+    max_duration: Optional[int] = None      # minutes
+    min_duration: Optional[int] = None      # minutes
+
 # Request body
-class QueryRequest(BaseModel):
+class QueryRequest(RecommendFilters):
     query: str
 
 # Response model
@@ -124,49 +421,417 @@ class Assessment(BaseModel):
 class RecommendationResponse(BaseModel):
     recommended_assessments: List[Assessment]
 
+# Batch request body
+class BatchQueryRequest(RecommendFilters):
+    queries: List[str]
+    use_llm: bool = False
+
+class BatchRecommendationResponse(BaseModel):
+    results: List[RecommendationResponse]
+
+MAX_BATCH_QUERIES = int(os.getenv("MAX_BATCH_QUERIES", "1000"))
+
+
+def request_mask(request: RecommendFilters, snapshot):
+    try:
+        return snapshot.catalog_filters.mask(
+            remote=request.remote,
+            adaptive=request.adaptive,
+            test_types=request.test_types,
+            max_duration=request.max_duration,
+            min_duration=request.min_duration
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+async def search_async(snapshot, query: str, mask=None):
+    """
+    Encode + search off the event loop: via the micro-batcher, or straight on the inference pool
+    """
+    with timed("search"):
+        if BATCHING_ENABLED:
+            return await asyncio.wrap_future(recommend_batcher.submit((snapshot, query, mask)))
+        results = await asyncio.wrap_future(inference_pool.submit(search_batch, snapshot, [query], [mask]))
+        return results[0]
+
+
+async def rewrite_query(query: str) -> str:
+    with timed("llm_rewrite"):
+        return await llm_client.rewrite(query)
+
+
+async def run_until_disconnect(http_request: Request, coro):
+    """
+    Run `coro`, cancelling it (and any in-flight LLM call) if the client goes away
+    """
+    task = asyncio.ensure_future(coro)
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+        if done:
+            return task.result()
+        if await http_request.is_disconnected():
+            task.cancel()
+            raise HTTPException(status_code=499, detail="Client closed request.")
+
+
+def _consume_result(task):
+    # Late rewrites still fill the cache; just make sure their errors are retrieved
+    if not task.cancelled():
+        task.exception()
+
+
+def rerank_hits(snapshot, query: str, hits):
+    """
+    Optional cross-encoder stage over the first-stage hits; always trims to TOP_K
+    """
+    indices, scores = hits
+    if reranker is None:
+        return indices[:TOP_K], scores[:TOP_K]
+    return reranker.rerank(query, indices, scores, snapshot.corpus, k=TOP_K)
+
+
+async def retrieve_pipeline(snapshot, query: str, mask=None):
+    """
+    First stage: returns (hits, query the hits should be reranked against)
+    """
+    if not LLM_REWRITE_ENABLED:
+        return await search_async(snapshot, query, mask), query
+
+    if LLM_DEADLINE_MS <= 0:
+        try:
+            refined_query = await rewrite_query(query)
+        except LLMUnavailableError:
+            fallback_stats["llm_unavailable"] += 1
+            fallback_stats["raw_only"] += 1
+            refined_query = query
+        else:
+            fallback_stats["rewritten"] += 1
+        return await search_async(snapshot, refined_query, mask), refined_query
+
+    # Raw-query retrieval and the LLM rewrite race against the deadline
+    raw_task = asyncio.ensure_future(search_async(snapshot, query, mask))
+    rewrite_task = asyncio.ensure_future(rewrite_query(query))
+    try:
+        done, _ = await asyncio.wait({rewrite_task}, timeout=LLM_DEADLINE_MS / 1000)
+    except asyncio.CancelledError:
+        raw_task.cancel()
+        rewrite_task.cancel()
+        raise
+
+    refined_query = None
+    if not done:
+        fallback_stats["deadline_missed"] += 1
+        rewrite_task.add_done_callback(_consume_result)
+    elif isinstance(rewrite_task.exception(), LLMUnavailableError):
+        fallback_stats["llm_unavailable"] += 1
+    elif rewrite_task.exception() is None:
+        refined_query = rewrite_task.result()
+
+    raw_hits = await raw_task
+    if refined_query is None:
+        fallback_stats["raw_only"] += 1
+        return raw_hits, query
+
+    fallback_stats["rewritten"] += 1
+    refined_hits = await search_async(snapshot, refined_query, mask)
+    if LLM_MERGE_RESULTS:
+        refined_hits = merge_hits(refined_hits, raw_hits, k=SEARCH_K)
+    return refined_hits, refined_query
+
+
+async def recommend_pipeline(snapshot, query: str, mask=None):
+    hits, rerank_query = await retrieve_pipeline(snapshot, query, mask)
+    if reranker is None:
+        return rerank_hits(snapshot, rerank_query, hits)
+    with timed("rerank"):
+        return await asyncio.wrap_future(inference_pool.submit(rerank_hits, snapshot, rerank_query, hits))
+
+
 @app.post("/recommend", response_model=RecommendationResponse)
-def recommend_assessments(request: QueryRequest):
-    if model is None or catalog_df is None or corpus_embeddings is None:
+async def recommend_assessments(request: QueryRequest, http_request: Request):
+    # One snapshot for the whole request, even if a reload swaps it meanwhile
+    snapshot = snapshots.current
+    if not boot.ready or snapshot is None:
         raise HTTPException(status_code=503, detail="Service not ready. Models still loading.")
+    if overloaded():
+        raise busy_error()
     
+    mask = request_mask(request, snapshot)
+
     try:
-        df: pd.DataFrame = query_handling_using_LLM_updated(
-            request.query,
-            model=model,
-            gemini_model=gemini_model,
-            catalog_df=catalog_df,
-            corpus=corpus,
-            corpus_embeddings=corpus_embeddings
-        )
+        indices, _ = await run_until_disconnect(http_request, recommend_pipeline(snapshot, request.query, mask))
 
-        if df.empty:
+        if len(indices) == 0:
             raise HTTPException(status_code=404, detail="No assessments found.")
 
-        results = []
-
-        for _, row in df.iterrows():
-            # Handle both old and new column names
-            assessment_name = row.get("Assessment Name") or row.get("assessment_name", "")
-            url = row.get("URL") or row.get("url", "")
-            adaptive = row.get("Adaptive/IRT") or row.get("adaptive_irt", "")
-            description = row.get("Description") or row.get("description", "")
-            duration = row.get("Duration") or row.get("duration", 0)
-            remote = row.get("Remote Testing Support") or row.get("remote_testing_support", "")
-            test_type = row.get("Test Type") or row.get("test_type", "")
-            skills = row.get("Skills") or row.get("skills", "")
-            
-            results.append({
-                "assessment_name": assessment_name,
-                "url": url,
-                "adaptive_support": adaptive,
-                "description": description,
-                "duration": int(duration) if duration else 0,
-                "remote_support": remote,
-                "test_type": test_type if isinstance(test_type, list) else [test_type] if test_type else [],
-                "skills": skills if isinstance(skills, list) else [skill.strip() for skill in str(skills).split(",")] if skills else []
-            })
-
-        return {"recommended_assessments": results}
+        # Records were validated against Assessment at startup; just gather the cached JSON
+        with timed("render"):
+            body = snapshot.catalog_records.response_json(indices)
+        return Response(content=body, media_type="application/json")
+
+    except HTTPException:
+        raise
+    except QueueFullError as e:
+        raise busy_error(e)
+    except LLMTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 
+# ---------------- Streaming ----------------
+def stage_event(snapshot, stage: str, query: str, indices, started: float, final: bool) -> bytes:
+    header = json.dumps({
+        "stage": stage,
+        "final": final,
+        "query": query,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+    })
+    return header[:-1].encode() + b',"recommended_assessments":' + snapshot.catalog_records.gather_json(indices) + b"}"
+
+
+async def stream_pipeline(snapshot, query: str, mask=None):
+    """
+    Yields one JSON event per stage as soon as it is ready: raw-query hits first, then
+    the Gemini-rewritten results, then the reranked ones. The last event has "final": true;
+    a failing later stage ends the stream with an "error" event after what was already sent.
+    """
+    started = time.perf_counter()
+    try:
+        raw_hits = await search_async(snapshot, query, mask)
+        hits, rerank_query = raw_hits, query
+        last_stage = not LLM_REWRITE_ENABLED and reranker is None
+        yield stage_event(snapshot, "raw", query, raw_hits[0][:TOP_K], started, last_stage)
+        if last_stage:
+            return
+
+        if LLM_REWRITE_ENABLED:
+            try:
+                refined_query = await rewrite_query(query)
+            except (LLMUnavailableError, LLMTimeoutError):
+                # Raw hits are already on screen; only the reranker can still improve them
+                fallback_stats["llm_unavailable"] += 1
+                fallback_stats["raw_only"] += 1
+            else:
+                fallback_stats["rewritten"] += 1
+                hits = await search_async(snapshot, refined_query, mask)
+                if LLM_MERGE_RESULTS:
+                    hits = merge_hits(hits, raw_hits, k=SEARCH_K)
+                rerank_query = refined_query
+                yield stage_event(snapshot, "refined", refined_query, hits[0][:TOP_K], started, reranker is None)
+
+        if reranker is not None:
+            with timed("rerank"):
+                indices, _ = await asyncio.wrap_future(inference_pool.submit(rerank_hits, snapshot, rerank_query, hits))
+            yield stage_event(snapshot, "reranked", rerank_query, indices, started, True)
+        elif hits is raw_hits:
+            # Rewrite failed and nothing follows: repeat the raw hits as the final answer
+            yield stage_event(snapshot, "raw", query, raw_hits[0][:TOP_K], started, True)
+    except QueueFullError as e:
+        yield json.dumps({"stage": "error", "final": True, "status": 429, "detail": str(e)}).encode()
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        yield json.dumps({"stage": "error", "final": True, "status": 500, "detail": str(e)}).encode()
+
+
+async def frame_events(events, sse: bool):
+    async for event in events:
+        yield b"data: " + event + b"\n\n" if sse else event + b"\n"
+
+
+@app.post("/recommend/stream")
+async def recommend_assessments_stream(request: QueryRequest, http_request: Request):
+    """
+    Progressive /recommend: NDJSON by default, Server-Sent Events with Accept: text/event-stream
+    """
+    snapshot = snapshots.current
+    if not boot.ready or snapshot is None:
+        raise HTTPException(status_code=503, detail="Service not ready. Models still loading.")
+    if overloaded():
+        raise busy_error()
+
+    mask = request_mask(request, snapshot)
+    sse = "text/event-stream" in http_request.headers.get("accept", "")
+    return StreamingResponse(
+        frame_events(stream_pipeline(snapshot, request.query, mask), sse),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        # Keep reverse proxies from buffering the early events
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def search_and_rerank_batch(snapshot, queries, mask=None):
+    return [rerank_hits(snapshot, q, hits) for q, hits in zip(queries, search_batch(snapshot, queries, mask))]
+
+
+async def rewrite_batch(queries):
+    """
+    Rewrite every query; an item whose rewrite is unavailable (breaker open) or times out
+    falls back to its raw query instead of failing the whole batch
+    """
+    rewrites = await asyncio.gather(*(rewrite_query(q) for q in queries), return_exceptions=True)
+    refined = []
+    for query, rewrite in zip(queries, rewrites):
+        if isinstance(rewrite, (LLMUnavailableError, LLMTimeoutError)):
+            fallback_stats["llm_unavailable"] += 1
+            fallback_stats["raw_only"] += 1
+            refined.append(query)
+        elif isinstance(rewrite, BaseException):
+            raise rewrite
+        else:
+            fallback_stats["rewritten"] += 1
+            refined.append(rewrite)
+    return refined
+
+
+async def batch_pipeline(snapshot, queries, use_llm: bool, mask=None):
+    if use_llm:
+        queries = await rewrite_batch(queries)
+    with timed("search"):
+        return await asyncio.wrap_future(inference_pool.submit(search_and_rerank_batch, snapshot, list(queries), mask))
+
+
+@app.post("/recommend/batch", response_model=BatchRecommendationResponse)
+async def recommend_assessments_batch(request: BatchQueryRequest, http_request: Request):
+    snapshot = snapshots.current
+    if not boot.ready or snapshot is None:
+        raise HTTPException(status_code=503, detail="Service not ready. Models still loading.")
+    if overloaded():
+        raise busy_error()
+
+    if len(request.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_QUERIES} queries per batch.")
+
+    mask = request_mask(request, snapshot)
+
+    try:
+        # One batched encode + one matrix-matrix similarity + batched top-k for every query
+        results = await run_until_disconnect(http_request, batch_pipeline(snapshot, request.queries, request.use_llm, mask))
+
+        with timed("render"):
+            body = b'{"results":[' + b",".join(snapshot.catalog_records.response_json(indices) for indices, _ in results) + b"]}"
+        return Response(content=body, media_type="application/json")
+
+    except HTTPException:
+        raise
+    except QueueFullError as e:
+        raise busy_error(e)
+    except LLMTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/stats/batching")
+def batching_stats():
+    return {"enabled": BATCHING_ENABLED, **recommend_batcher.stats()}
+
+
+@app.get("/stats/inference")
+def inference_stats():
+    return inference_pool.stats()
+
+
+@app.get("/stats/cache")
+def cache_stats():
+    return {
+        "llm_rewrite": rewrite_cache.stats(),
+        "query_embedding": query_embedding_cache.stats()
+    }
+
+
+@app.get("/stats/rerank")
+def rerank_stats():
+    return {"enabled": reranker is not None, **(reranker.stats() if reranker is not None else {})}
+
+
+@app.get("/stats/llm")
+def llm_stats():
+    stats = llm_client.stats() if llm_client is not None else {}
+    return {**stats, "deadline_ms": LLM_DEADLINE_MS, "fallback": fallback_stats}
+
+
+def check_admin_token(http_request: Request):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN not set).")
+    if http_request.headers.get("X-Admin-Token") != ADMIN_TOKEN:
+        raise HTTPException(status_code=401, detail="Invalid admin token.")
+
+
+@app.get("/admin/snapshot")
+def snapshot_stats():
+    return snapshots.stats()
+
+
+@app.post("/admin/reload")
+async def reload_snapshot(http_request: Request, force: bool = False):
+    """
+    Load, warm and swap in the catalog on disk; in-flight requests finish on the old snapshot
+    """
+    check_admin_token(http_request)
+    loop = asyncio.get_running_loop()
+    try:
+        snapshot, swapped = await loop.run_in_executor(None, snapshots.reload, force)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not swapped and snapshots.last_error:
+        raise HTTPException(status_code=500, detail=snapshots.last_error)
+    return {"swapped": swapped, **snapshot.info()}
+
+
+@app.get("/stats/memory")
+def memory_stats():
+    # Per-worker memory; with PRELOAD_MODELS the model and index pages show up as shared, not private
+    return {"preloaded": preloaded, **process_memory()}
+
+
+
+# ---------------- Metrics ----------------
+def service_metrics():
+    """
+    Scrape-time view of the counters the components already keep
+    """
+    yield "ready", "gauge", "1 once warm-up has finished", int(boot.ready), {}
+
+    if llm_client is not None:
+        llm = llm_client.stats()
+        yield "llm_calls_total", "counter", "Gemini calls made (cache misses)", llm["calls"], {}
+        yield "llm_errors_total", "counter", "Gemini calls that failed", llm["errors"], {}
+        yield "llm_timeouts_total", "counter", "Gemini calls that timed out", llm["timeouts"], {}
+        yield "llm_in_flight", "gauge", "Gemini calls in flight", llm["in_flight"], {}
+    for reason, count in fallback_stats.items():
+        yield "llm_outcomes_total", "counter", "Rewrite outcome per request", count, {"outcome": reason}
+
+    caches = {"llm_rewrite": rewrite_cache.stats(), "query_embedding": query_embedding_cache.stats()}
+    if reranker is not None:
+        caches["rerank"] = reranker.cache.stats()
+    for name, stats in caches.items():
+        yield "cache_hits_total", "counter", "Cache hits", stats["hits"] + stats.get("persistent_hits", 0), {"cache": name}
+        yield "cache_misses_total", "counter", "Cache misses", stats["misses"], {"cache": name}
+        yield "cache_entries", "gauge", "Entries currently cached", stats["size"], {"cache": name}
+
+    inference = inference_pool.stats()
+    yield "inference_pending", "gauge", "Inference calls queued or running", inference["pending"], {}
+    yield "inference_rejected_total", "counter", "Calls refused because a queue was full", inference["rejected"], {"queue": "inference"}
+    yield "inference_rejected_total", "counter", "Calls refused because a queue was full", recommend_batcher.rejected, {"queue": "batcher"}
+
+    yield "snapshot_reloads_total", "counter", "Catalog snapshots swapped in", snapshots.reloads, {}
+    yield "snapshot_reload_failures_total", "counter", "Catalog reloads that failed", snapshots.failures, {}
+
+
+registry.add_collector(service_metrics)
+# Queue / batch histograms the batcher and inference pool already keep
+registry.histogram("inference_queue_wait_ms", "Wait for an inference thread", histogram=inference_pool.queue_wait_ms)
+registry.histogram("inference_run_ms", "Time on an inference thread", histogram=inference_pool.run_ms)
+registry.histogram("batch_size", "Queries per micro-batch", histogram=recommend_batcher.batch_sizes)
+registry.histogram("batch_queue_wait_ms", "Wait for the next micro-batch", histogram=recommend_batcher.queue_wait_ms)
+
+
+@app.get("/metrics")
+def metrics():
+    # Prometheus text format; per process, so scrape each worker (or aggregate) when running several
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+if PRELOAD_MODELS:
+    preload()
@@ -1,61 +1,243 @@
-import json
+import threading
 import numpy as np
 import pandas as pd
-import re
-import torch
-from sentence_transformers import SentenceTransformer, util
-import google.generativeai as genai
 from dotenv import load_dotenv
 import os
+from src.embeddings import load_embeddings, encode_queries, get_index
+from src.index import ExactIndex
+from src.cache import TTLCache
+from src.llm import GEMINI_MODEL_NAME, build_rewrite_prompt, rewrite_cache_key
+from src.filters import FilterIndex
+from src.catalog import CatalogRecords
+from src.lexical import load_lexical_index, hybrid_search, RETRIEVAL_MODE
+from src.encoders import load_checked_encoder
+from src.warmup import WarmupTracker
+from src.metrics import timed
 
 # ---------------- LOAD DATA ----------------
 CATALOG_PATH = "data/processed/shl_catalog_clean.csv"
 
-catalog_df = pd.read_csv(CATALOG_PATH)
+# Nothing heavy happens at import: the catalog, model, indexes and Gemini are loaded by
+# warm_up(), on first use of any of these module attributes or explicitly at boot
+LAZY_ATTRIBUTES = (
+    "catalog_df", "model", "corpus_embeddings", "corpus_index", "corpus", "query_encoder",
+    "lexical_index", "catalog_filters", "catalog_records", "gemini_model"
+)
 
-corpus = catalog_df["combined_text"].fillna("").tolist()
+warmup = WarmupTracker("query_functions")
+_service = None
+_service_lock = threading.Lock()
+
+
+def warm_up() -> dict:
+    """
+    Load every module-level resource once, timing each stage. Safe to call from several threads.
+    """
+    global _service
+    if _service is not None:
+        return _service
+
+    with _service_lock:
+        if _service is not None:
+            return _service
+
+        service = {}
+        # Embeddings are memory-mapped from the shared on-disk store instead of being re-encoded
+        with warmup.stage("catalog_model_embeddings"):
+            service["catalog_df"], service["model"], service["corpus_embeddings"] = load_embeddings(CATALOG_PATH)
+            service["corpus"] = service["catalog_df"]["combined_text"].fillna("").tolist()
+
+        with warmup.stage("index"):
+            service["corpus_index"] = get_index(service["corpus_embeddings"])
+            # BM25 inverted index over the same texts (persisted by src/preprocessing.py)
+            service["lexical_index"] = load_lexical_index(service["corpus"]) if RETRIEVAL_MODE == "hybrid" else None
+
+        # Query-side encoder (ENCODER_BACKEND=torch|int8|onnx), parity-checked against the stored corpus vectors
+        with warmup.stage("query_encoder"):
+            service["query_encoder"] = load_checked_encoder(service["corpus"], service["corpus_embeddings"], base_model=service["model"])
+
+        with warmup.stage("filters_records"):
+            # Boolean column indexes for remote / adaptive / test type / duration constraints
+            service["catalog_filters"] = FilterIndex(service["catalog_df"])
+            # Column-normalised, response-ready records (no per-request pandas row access)
+            service["catalog_records"] = CatalogRecords(service["catalog_df"])
+
+        with warmup.stage("gemini"):
+            import google.generativeai as genai
+
+            load_dotenv()
+            genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+            service["gemini_model"] = genai.GenerativeModel(GEMINI_MODEL_NAME)
+
+        with warmup.stage("first_query"):
+            encode_queries(service["query_encoder"], ["warm-up"], cache=None)
+
+        _service = service
+        warmup.mark_ready()
+    return _service
+
+
+def __getattr__(name):
+    if name in LAZY_ATTRIBUTES:
+        return warm_up()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-model = SentenceTransformer("all-MiniLM-L6-v2")
-corpus_embeddings = model.encode(corpus, convert_to_tensor=True)
 
 # ---------------- LLM SETUP ----------------
-load_dotenv()
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-gemini_model = genai.GenerativeModel("gemini-2.5-flash")
+# Rewrites are cached per normalised query; LLM_CACHE_PATH adds a SQLite tier that survives restarts
+rewrite_cache = TTLCache(
+    maxsize=int(os.getenv("LLM_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("LLM_CACHE_TTL_SECONDS", "86400")),
+    persist_path=os.getenv("LLM_CACHE_PATH") or None
+)
 
 # ---------------- HELPERS ----------------
-def extract_features_with_llm(user_query: str) -> str:
-    prompt = f"""
-Extract key hiring intent from the query below.
-Return a concise sentence with skills, role, constraints.
-
-Query:
-{user_query}
-"""
-    response = gemini_model.generate_content(prompt)
-    return response.text.strip()
-
-def find_assessments(query: str, k: int = 10):
-    query_embedding = model.encode(query, convert_to_tensor=True)
-    scores = util.cos_sim(query_embedding, corpus_embeddings)[0]
-    top_k = min(k, len(scores))
-    top_results = torch.topk(scores, k=top_k)
-
-    rows = []
-    for idx, score in zip(top_results.indices, top_results.values):
-        row = catalog_df.iloc[int(idx)]
-        rows.append({
-            "Assessment Name": row["assessment_name"],
-            "URL": row["url"],
-            "Remote Testing Support": row["remote"],
-            "Adaptive/IRT": row["adaptive"],
-            "Test Type": row["test_type"],
-            "Description": row["combined_text"],
-            "Score": float(score)
-        })
-    return rows
-
-def query_handling_using_LLM_updated(query: str):
-    refined_query = extract_features_with_llm(query)
-    results = find_assessments(refined_query, k=10)
+def extract_features_with_llm(user_query: str, gemini_model=None) -> str:
+    gemini_model = gemini_model or warm_up()["gemini_model"]
+
+    cache_key = rewrite_cache_key(user_query)
+    cached = rewrite_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    prompt = build_rewrite_prompt(user_query)
+    with timed("llm_rewrite"):
+        response = gemini_model.generate_content(prompt)
+    refined = response.text.strip()
+
+    rewrite_cache.put(cache_key, refined)
+    return refined
+
+def _resolve_search_args(model, corpus_embeddings, corpus_index):
+    model = model if model is not None else warm_up()["query_encoder"]
+    if corpus_index is None:
+        corpus_index = ExactIndex(corpus_embeddings) if corpus_embeddings is not None else warm_up()["corpus_index"]
+    return model, corpus_index
+
+def _resolve_records(catalog_df, catalog_records):
+    if catalog_records is not None:
+        return catalog_records
+    return CatalogRecords(catalog_df) if catalog_df is not None else warm_up()["catalog_records"]
+
+def _stack_masks(masks, n_queries):
+    """
+    None / one shared 1-D mask / a per-query list (None = unrestricted) -> what index.search expects
+    """
+    if masks is None or isinstance(masks, np.ndarray):
+        return masks
+    if all(m is None for m in masks):
+        return None
+    n_rows = len(next(m for m in masks if m is not None))
+    return np.stack([m if m is not None else np.ones(n_rows, dtype=bool) for m in masks])
+
+def search_catalog_batch(queries, k: int = 10, model=None, corpus_embeddings=None, corpus_index=None, masks=None, lexical_index=None):
+    """
+    One batched encode + one matrix-matrix search for all queries.
+    Returns one (indices, scores) pair of arrays per query, best first.
+    `masks` is one shared eligibility mask or a list with one (or None) per query.
+    With a `lexical_index` (defaults to the module's in hybrid mode), the BM25 ranking
+    is fused with the dense one.
+    """
+    if not queries:
+        return []
+    model, corpus_index = _resolve_search_args(model, corpus_embeddings, corpus_index)
+    if lexical_index is None and corpus_embeddings is None:
+        lexical_index = warm_up()["lexical_index"]
+
+    queries = list(queries)
+    with timed("encode"):
+        query_embeddings = encode_queries(model, queries)
+    mask = _stack_masks(masks, len(queries))
+    with timed("index_search"):
+        if lexical_index is not None:
+            top_values, top_indices = hybrid_search(queries, query_embeddings, corpus_index, lexical_index, k=k, mask=mask)
+        else:
+            top_values, top_indices = corpus_index.search(query_embeddings, k=k, mask=mask)
+
+    hits = []
+    for indices, scores in zip(top_indices, top_values):
+        found = indices >= 0
+        hits.append((indices[found], scores[found]))
+    return hits
+
+def find_assessments(query: str, k: int = 10, model=None, catalog_df=None, corpus_embeddings=None, corpus_index=None, mask=None, catalog_records=None):
+    return find_assessments_batch(
+        [query],
+        k=k,
+        model=model,
+        catalog_df=catalog_df,
+        corpus_embeddings=corpus_embeddings,
+        corpus_index=corpus_index,
+        masks=None if mask is None else [mask],
+        catalog_records=catalog_records
+    )[0]
+
+def find_assessments_batch(queries, k: int = 10, model=None, catalog_df=None, corpus_embeddings=None, corpus_index=None, masks=None, catalog_records=None):
+    """
+    Batched search returning a display-row list per query
+    """
+    catalog_records = _resolve_records(catalog_df, catalog_records)
+    hits = search_catalog_batch(
+        queries,
+        k=k,
+        model=model,
+        corpus_embeddings=corpus_embeddings,
+        corpus_index=corpus_index,
+        masks=masks
+    )
+    return [catalog_records.gather_rows(indices, scores) for indices, scores in hits]
+
+def merge_hits(primary, secondary, k: int = 10):
+    """
+    Union of two (indices, scores) hit lists, de-duplicated by row (best score kept), best first
+    """
+    best = {}
+    for indices, scores in (primary, secondary):
+        for i, score in zip(np.asarray(indices).tolist(), np.asarray(scores).tolist()):
+            if i not in best or score > best[i]:
+                best[i] = score
+    ranked = sorted(best.items(), key=lambda item: item[1], reverse=True)[:k]
+    return (
+        np.array([i for i, _ in ranked], dtype=np.int64),
+        np.array([score for _, score in ranked], dtype=np.float32)
+    )
+
+def query_handling_using_LLM_updated(query: str, model=None, gemini_model=None, catalog_df=None, corpus=None, corpus_embeddings=None, corpus_index=None):
+    refined_query = extract_features_with_llm(query, gemini_model=gemini_model)
+    results = find_assessments(
+        refined_query,
+        k=10,
+        model=model,
+        catalog_df=catalog_df,
+        corpus_embeddings=corpus_embeddings,
+        corpus_index=corpus_index
+    )
     return pd.DataFrame(results)
+
+def query_handling_stream(query: str, model=None, gemini_model=None, catalog_df=None, corpus_embeddings=None, corpus_index=None):
+    """
+    Yields (stage, results DataFrame): the raw-query matches right away, then the
+    matches for the Gemini-refined query. A failed rewrite ends the stream after "raw".
+    """
+    search_args = dict(k=10, model=model, catalog_df=catalog_df, corpus_embeddings=corpus_embeddings, corpus_index=corpus_index)
+    yield "raw", pd.DataFrame(find_assessments(query, **search_args))
+
+    try:
+        refined_query = extract_features_with_llm(query, gemini_model=gemini_model)
+    except Exception as e:
+        print(f"⚠️ Query rewrite failed, keeping raw-query results: {e}")
+        return
+    yield "refined", pd.DataFrame(find_assessments(refined_query, **search_args))
+
+def query_handling_batch(queries, use_llm: bool = False, model=None, gemini_model=None, catalog_df=None, corpus=None, corpus_embeddings=None, corpus_index=None):
+    if use_llm:
+        queries = [extract_features_with_llm(q, gemini_model=gemini_model) for q in queries]
+    results = find_assessments_batch(
+        queries,
+        k=10,
+        model=model,
+        catalog_df=catalog_df,
+        corpus_embeddings=corpus_embeddings,
+        corpus_index=corpus_index
+    )
+    return [pd.DataFrame(rows) for rows in results]
@@ -1,11 +1,12 @@
 from fastapi import FastAPI
 from pydantic import BaseModel
-from src.embeddings import load_embeddings
+from src.embeddings import load_embeddings, get_index
 from src.recommender import recommend
 
 app = FastAPI()
 
 df, model, embeddings = load_embeddings()
+index = get_index(embeddings)
 
 class QueryRequest(BaseModel):
     query: str
@@ -20,7 +21,7 @@ def root():
 
 @app.post("/recommend")
 def recommend_api(req: QueryRequest):
-    recs = recommend(req.query, df, model, embeddings)
+    recs = recommend(req.query, df, model, embeddings, index=index)
     return {
         "recommendations": recs.to_dict(orient="records")
     }
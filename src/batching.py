@@ -0,0 +1,134 @@
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+try:
+    from src.metrics import Histogram, BATCH_SIZE_BUCKETS, LATENCY_BUCKETS_MS
+    from src.inference import QueueFullError
+except ImportError:
+    from metrics import Histogram, BATCH_SIZE_BUCKETS, LATENCY_BUCKETS_MS
+    from inference import QueueFullError
+
+# Coalescing window and batch cap for concurrent requests
+BATCH_MAX_WAIT_MS = float(os.getenv("RECOMMEND_BATCH_MAX_WAIT_MS", "2"))
+BATCH_MAX_SIZE = int(os.getenv("RECOMMEND_BATCH_MAX_SIZE", "32"))
+# Items allowed to wait for the next batch (0 = unbounded); submit() raises QueueFullError beyond it.
+# Counted in queries, independently of the inference pool's backlog (which counts batches)
+BATCH_MAX_QUEUE = int(os.getenv("RECOMMEND_BATCH_MAX_QUEUE", "512"))
+
+_STOP = object()
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-item calls into one `batch_fn(items)` call.
+    The first queued item opens a window of `max_wait_ms`; the batch is flushed
+    when the window closes or `max_batch_size` items have arrived.
+    `batch_fn` must return one result per item, in order.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS, max_queue=BATCH_MAX_QUEUE, name="batcher"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.max_queue = max(0, max_queue)
+        self.name = name
+        self.rejected = 0
+
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait_ms = Histogram(LATENCY_BUCKETS_MS)
+
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._thread = None
+        self._stopping = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            if self._thread is not None:
+                # Never block on a full queue: the worker also checks the flag after each batch
+                self._stopping = True
+                try:
+                    self._queue.put_nowait(_STOP)
+                except queue.Full:
+                    pass
+                self._thread.join()
+                self._thread = None
+
+    def submit(self, item) -> Future:
+        future = Future()
+        self.start()
+        try:
+            self._queue.put_nowait((item, future, time.perf_counter()))
+        except queue.Full:
+            self.rejected += 1
+            raise QueueFullError(f"Batch queue full ({self.max_queue} items waiting).")
+        return future
+
+    def full(self) -> bool:
+        return self.max_queue > 0 and self._queue.qsize() >= self.max_queue
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+
+            batch = [first]
+            stop = False
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if entry is _STOP:
+                    stop = True
+                    break
+                batch.append(entry)
+
+            self._process(batch)
+            if stop or (self._stopping and self._queue.empty()):
+                return
+
+    def _process(self, batch):
+        # Drop callers that gave up (cancelled) before the batch ran
+        batch = [entry for entry in batch if entry[1].set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        now = time.perf_counter()
+        self.batch_sizes.observe(len(batch))
+        for _, _, enqueued in batch:
+            self.queue_wait_ms.observe((now - enqueued) * 1000)
+
+        try:
+            results = self.batch_fn([item for item, _, _ in batch])
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        for (_, future, _), result in zip(batch, results):
+            future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "max_queue": self.max_queue,
+            "queued": self._queue.qsize(),
+            "rejected": self.rejected,
+            "batch_size": self.batch_sizes.snapshot(),
+            "queue_wait_ms": self.queue_wait_ms.snapshot()
+        }
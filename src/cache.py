@@ -0,0 +1,249 @@
+import os
+import re
+import time
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# Persistent tier housekeeping: prune expired / excess rows every N writes
+PERSIST_PRUNE_EVERY = 100
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """
+    Cache key normalisation: case, surrounding punctuation and whitespace runs are ignored
+    """
+    text = _WHITESPACE.sub(" ", str(text)).strip().lower()
+    return text.strip(" .,;:!?\"'")
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with per-entry TTL and hit/miss statistics.
+    With `persist_path` set, entries are also written to a SQLite file so a
+    warm restart starts with the previous process's cache. The connection is
+    opened on first use in each process, so a cache created before a fork
+    (e.g. gunicorn preload) never shares one with its workers.
+    Values must be JSON-serialisable when persistence is enabled.
+    """
+
+    def __init__(self, maxsize=1024, ttl=3600, persist_path=None, persist_maxsize=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.persist_path = persist_path
+        self.persist_maxsize = persist_maxsize or maxsize * 10
+
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        # SQLite work has its own lock so memory lookups never wait behind a disk commit
+        self._db = None
+        self._db_pid = None
+        self._db_lock = threading.Lock()
+
+    @property
+    def persistent(self) -> bool:
+        return bool(self.persist_path)
+
+    def _connection(self):
+        # Caller holds _db_lock; SQLite connections must not be used across fork()
+        if not self.persist_path:
+            return None
+        if self._db_pid != os.getpid():
+            os.makedirs(os.path.dirname(self.persist_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.persist_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT, expires_at REAL)"
+            )
+            self._db.commit()
+            self._db_pid = os.getpid()
+        return self._db
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        value = self.get_memory(key)
+        if value is not None:
+            return value
+        return self.get_persistent(key, default)
+
+    def get_memory(self, key):
+        """
+        In-memory tier only (never touches disk); None on a miss, which is not counted
+        here - follow up with get_persistent, which counts it
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at >= now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+            self.expirations += 1
+            return None
+
+    def get_persistent(self, key, default=None):
+        """
+        SQLite tier lookup (blocking I/O; call off the event loop). Hits are promoted to memory.
+        """
+        row = None
+        if self.persist_path:
+            with self._db_lock:
+                row = self._connection().execute(
+                    "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+                ).fetchone()
+
+        with self._lock:
+            if row is not None and row[1] >= time.time():
+                value = json.loads(row[0])
+                self._store(key, value, row[1])
+                self.persistent_hits += 1
+                return value
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        expires_at = self.put_memory(key, value)
+        self.put_persistent(key, value, expires_at)
+
+    def put_memory(self, key, value) -> float:
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._store(key, value, expires_at)
+        return expires_at
+
+    def put_persistent(self, key, value, expires_at):
+        """
+        SQLite tier write + commit (blocking I/O; call off the event loop)
+        """
+        if not self.persist_path:
+            return
+        with self._db_lock:
+            db = self._connection()
+            db.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at)
+            )
+            self._writes += 1
+            if self._writes % PERSIST_PRUNE_EVERY == 0:
+                self._prune_persistent(db)
+            db.commit()
+
+    def _store(self, key, value, expires_at):
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def _prune_persistent(self, db):
+        db.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+        db.execute(
+            "DELETE FROM cache WHERE key NOT IN (SELECT key FROM cache ORDER BY expires_at DESC LIMIT ?)",
+            (self.persist_maxsize,)
+        )
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+        if self.persist_path:
+            with self._db_lock:
+                db = self._connection()
+                db.execute("DELETE FROM cache")
+                db.commit()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.persistent_hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "persistent": self.persistent,
+            "hits": self.hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": (self.hits + self.persistent_hits) / lookups if lookups else 0.0
+        }
+
+
+class EmbeddingCache:
+    """
+    Thread-safe LRU cache of query vectors bounded by memory (bytes of vector + key),
+    keyed on the exact text sent to the encoder.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+
+        self._data = OrderedDict()  # key -> (vector, nbytes)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, vector):
+        nbytes = vector.nbytes + len(str(key)) + 64  # rough per-entry overhead
+        if nbytes > self.max_bytes:
+            return
+
+        # Cached vectors are shared between callers, so freeze them
+        vector.setflags(write=False)
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self._data[key] = (vector, nbytes)
+            self.bytes += nbytes
+            while self.bytes > self.max_bytes:
+                _, (_, evicted) = self._data.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
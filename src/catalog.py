@@ -0,0 +1,130 @@
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+
+# Canonical field -> candidate columns (processed catalog first, then the older export format)
+FIELD_COLUMNS = {
+    "assessment_name": ["assessment_name", "Assessment Name"],
+    "url": ["url", "URL"],
+    "adaptive_support": ["adaptive", "adaptive_irt", "Adaptive/IRT"],
+    "description": ["description", "Description", "combined_text", "combined"],
+    "duration": ["duration", "Duration"],
+    "remote_support": ["remote", "remote_testing_support", "Remote Testing Support"],
+    "test_type": ["test_type", "Test Type"],
+    "skills": ["skills", "Skills"],
+}
+
+
+def catalog_hash(texts) -> str:
+    """
+    Content hash of the corpus texts, used to detect stale embedding / lexical stores
+    """
+    h = hashlib.sha256()
+    for text in texts:
+        h.update(str(text).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def row_hashes(texts) -> list:
+    """
+    Per-row content hashes, used to re-encode only the rows that changed
+    """
+    return [hashlib.sha256(str(text).encode("utf-8")).hexdigest()[:16] for text in texts]
+
+
+def _column(df, field) -> pd.Series:
+    for col in FIELD_COLUMNS[field]:
+        if col in df.columns:
+            return df[col]
+    return pd.Series([None] * len(df), index=df.index, dtype=object)
+
+
+def _text(values) -> list:
+    return values.where(values.notna(), "").astype(str).str.strip().tolist()
+
+
+def _split(values) -> list:
+    return [
+        [part.strip() for part in str(v).split(",") if part.strip()] if pd.notna(v) and str(v).strip() else []
+        for v in values
+    ]
+
+
+def _minutes(values) -> list:
+    extracted = values.astype(str).str.extract(r"(\d+)")[0]
+    return pd.to_numeric(extracted, errors="coerce").fillna(0).astype(int).tolist()
+
+
+def normalize_catalog(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    One column per response field, whatever naming scheme the catalog uses.
+    test_type and skills are pre-split into lists; duration is whole minutes (0 = unknown).
+    """
+    return pd.DataFrame({
+        "assessment_name": _text(_column(df, "assessment_name")),
+        "url": _text(_column(df, "url")),
+        "adaptive_support": _text(_column(df, "adaptive_support")),
+        "description": _text(_column(df, "description")),
+        "duration": _minutes(_column(df, "duration")),
+        "remote_support": _text(_column(df, "remote_support")),
+        "test_type": _split(_column(df, "test_type")),
+        "skills": _split(_column(df, "skills")),
+    })
+
+
+class CatalogRecords:
+    """
+    Response-ready view of the catalog built once: serialisable records in the
+    API schema, their JSON encodings, and the legacy display rows used by
+    find_assessments / the Streamlit app. Turning top-k indices into a response
+    is a list gather plus a byte join.
+    """
+
+    def __init__(self, df: pd.DataFrame, validate=None):
+        normalized = normalize_catalog(df)
+        self.records = normalized.to_dict("records")
+
+        # e.g. validate=Assessment: fail at startup, not per request, on a malformed catalog
+        if validate is not None:
+            for record in self.records:
+                validate(**record)
+
+        self.json = [json.dumps(record, ensure_ascii=False).encode("utf-8") for record in self.records]
+
+        self.display_rows = [
+            {
+                "Assessment Name": r["assessment_name"],
+                "URL": r["url"],
+                "Remote Testing Support": r["remote_support"],
+                "Adaptive/IRT": r["adaptive_support"],
+                "Test Type": ", ".join(r["test_type"]),
+                "Description": r["description"],
+            }
+            for r in self.records
+        ]
+
+    def __len__(self):
+        return len(self.records)
+
+    def gather(self, indices) -> list:
+        return [self.records[i] for i in np.asarray(indices).tolist()]
+
+    def gather_rows(self, indices, scores) -> list:
+        """
+        Display rows (Assessment Name, URL, ..., Score) for the given hits
+        """
+        return [
+            {**self.display_rows[i], "Score": s}
+            for i, s in zip(np.asarray(indices).tolist(), np.asarray(scores).tolist())
+        ]
+
+    def gather_json(self, indices) -> bytes:
+        """
+        JSON array of the pre-serialised records
+        """
+        return b"[" + b",".join(self.json[i] for i in np.asarray(indices).tolist()) + b"]"
+
+    def response_json(self, indices) -> bytes:
+        return b'{"recommended_assessments":' + self.gather_json(indices) + b"}"
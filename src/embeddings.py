@@ -1,11 +1,389 @@
 import pandas as pd
+import numpy as np
 import os
-import pickle
-from sentence_transformers import SentenceTransformer
+import json
+import glob
+
+try:
+    from src.index import INDEX_TYPE, build_index, load_index, index_config
+    from src.cache import EmbeddingCache
+    from src.catalog import catalog_hash, row_hashes
+except ImportError:
+    from index import INDEX_TYPE, build_index, load_index, index_config
+    from cache import EmbeddingCache
+    from catalog import catalog_hash, row_hashes
 
 # Paths
 CLEAN_DATA_PATH = "data/processed/shl_catalog_clean.csv"
-EMBEDDINGS_PATH = "data/processed/shl_embeddings.pkl"
+EMBEDDINGS_DIR = "data/processed/embeddings"
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+# float16 halves the mapped size; scoring upcasts chunk by chunk
+EMBEDDINGS_DTYPE = os.getenv("EMBEDDINGS_DTYPE", "float32")
+
+# Process-wide cache of query vectors (QUERY_EMBEDDING_CACHE_MB=0 disables it)
+QUERY_EMBEDDING_CACHE_MB = float(os.getenv("QUERY_EMBEDDING_CACHE_MB", "64"))
+query_embedding_cache = EmbeddingCache(max_bytes=int(QUERY_EMBEDDING_CACHE_MB * 1024 * 1024))
+
+METADATA_COLUMNS = [
+    "id",
+    "assessment_name",
+    "url",
+    "remote",
+    "adaptive",
+    "test_type"
+]
+
+
+def catalog_metadata(df: pd.DataFrame):
+    """
+    The catalog columns stored next to the vectors; "id" lets updates match rows by catalog id
+    """
+    columns = [c for c in METADATA_COLUMNS if c in df.columns]
+    return df[columns] if columns else None
+
+
+def load_model(model_name=MODEL_NAME):
+    # sentence_transformers pulls in torch; only paid for when a model is actually needed
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(model_name)
+
+
+def store_dir(model_name=MODEL_NAME, root=EMBEDDINGS_DIR) -> str:
+    return os.path.join(root, model_name.replace("/", "__"))
+
+
+def _atomic_write_json(data, path):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def read_manifest(directory):
+    path = os.path.join(directory, "manifest.json")
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"⚠️ Could not read embedding manifest {path}: {e}")
+        return None
+
+
+def open_embeddings(directory, manifest):
+    """
+    Memory-map the embedding matrix read-only. Every worker on the host shares
+    the same page-cache pages instead of holding a private copy.
+    """
+    return np.load(os.path.join(directory, manifest["embeddings_file"]), mmap_mode="r")
+
+
+def load_metadata(directory, manifest=None) -> pd.DataFrame:
+    manifest = manifest or read_manifest(directory)
+    with open(os.path.join(directory, manifest["metadata_file"]), "r", encoding="utf-8") as f:
+        return pd.DataFrame(json.load(f))
+
+
+def write_store(embeddings, model_name, content_hash, metadata=None, dtype=EMBEDDINGS_DTYPE, root=EMBEDDINGS_DIR, hashes=None, update=None):
+    """
+    Write normalised vectors as a raw .npy matrix plus a columnar metadata file.
+    `hashes` (one per row) are stored with the metadata for the next incremental update.
+    The manifest is swapped in last, so readers never see a half-written store.
+    """
+    directory = store_dir(model_name, root)
+    os.makedirs(directory, exist_ok=True)
+
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    embeddings = (embeddings / np.maximum(norms, 1e-12)).astype(dtype)
+
+    version = content_hash[:16]
+    embeddings_file = f"embeddings-{version}-{dtype}.npy"
+    metadata_file = f"metadata-{version}.json"
+
+    tmp_path = os.path.join(directory, f"{embeddings_file}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        np.save(f, np.ascontiguousarray(embeddings))
+    os.replace(tmp_path, os.path.join(directory, embeddings_file))
+
+    columns = {}
+    if metadata is not None:
+        columns = {c: metadata[c].astype(object).where(metadata[c].notna(), None).tolist() for c in metadata.columns}
+    if hashes is not None:
+        columns["row_hash"] = list(hashes)
+    _atomic_write_json(columns, os.path.join(directory, metadata_file))
+
+    manifest = {
+        "model_name": model_name,
+        "catalog_hash": content_hash,
+        "dtype": dtype,
+        "shape": list(embeddings.shape),
+        "normalized": True,
+        "embeddings_file": embeddings_file,
+        "metadata_file": metadata_file
+    }
+    if update is not None:
+        manifest["last_update"] = update
+    _atomic_write_json(manifest, os.path.join(directory, "manifest.json"))
+
+    # Drop superseded versions; workers still mapping them keep their pages until they re-open
+    for old in glob.glob(os.path.join(directory, "embeddings-*.npy")) + glob.glob(os.path.join(directory, "metadata-*.json")):
+        if os.path.basename(old) not in (embeddings_file, metadata_file):
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+    return directory, manifest
+
+
+def diff_rows(directory, manifest, hashes, ids=None):
+    """
+    Compare the incoming rows with the stored ones, matched by catalog id when both
+    sides have one and by content hash otherwise.
+    Returns (previous_rows, stats): previous_rows[i] is the stored row whose vector
+    new row i can reuse, or -1 when it has to be encoded. None when nothing is reusable.
+    """
+    if manifest is None:
+        return None, None
+    try:
+        stored = load_metadata(directory, manifest)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"⚠️ Could not read stored metadata: {e}")
+        return None, None
+    if "row_hash" not in stored.columns:
+        return None, None
+
+    old_hashes = stored["row_hash"].tolist()
+    if ids is not None and "id" in stored.columns:
+        keys = [str(v) for v in ids]
+        old_keys = [str(v) for v in stored["id"].tolist()]
+    else:
+        keys, old_keys = list(hashes), old_hashes
+    old_position = {key: i for i, key in enumerate(old_keys)}
+
+    previous_rows = np.full(len(keys), -1, dtype=np.int64)
+    added = changed = 0
+    for i, (key, row_hash) in enumerate(zip(keys, hashes)):
+        j = old_position.get(key)
+        if j is None:
+            added += 1
+        elif old_hashes[j] != row_hash:
+            changed += 1
+        else:
+            previous_rows[i] = j
+
+    stats = {
+        "added": added,
+        "changed": changed,
+        "deleted": len(set(old_keys) - set(keys)),
+        "reused": int((previous_rows >= 0).sum())
+    }
+    return previous_rows, stats
+
+
+def _update_index(directory, old_manifest, manifest, embeddings, previous_rows):
+    """
+    Carry the previous retrieval index over to the new store version (kept rows
+    keep their buckets, only new rows are assigned) instead of rebuilding it
+    """
+    entry = (old_manifest or {}).get("index") or {}
+    path = os.path.join(directory, entry.get("file", ""))
+    if not entry or not os.path.exists(path):
+        return None
+    try:
+        index = load_index(path, embeddings, entry["kind"]).update(embeddings, previous_rows)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"⚠️ Could not update {entry.get('kind')} index: {e}")
+        return None
+    # The carried-over index keeps the settings it was built with
+    save_index(index, directory, manifest, config=entry.get("config"))
+    return index
+
+
+def get_corpus_embeddings(texts, model=None, model_name=MODEL_NAME, metadata=None, dtype=EMBEDDINGS_DTYPE, root=EMBEDDINGS_DIR):
+    """
+    Return a read-only memory-mapped matrix of normalised embeddings for `texts`.
+    The store is keyed by model name + catalog content hash. When the catalog
+    changes, only added or changed rows are encoded; vectors of unchanged rows are
+    copied over, deleted rows are compacted out and the index is updated in place.
+    """
+    texts = [str(t) for t in texts]
+    content_hash = catalog_hash(texts)
+    directory = store_dir(model_name, root)
+
+    manifest = read_manifest(directory)
+    if (
+        manifest is not None
+        and manifest.get("model_name") == model_name
+        and manifest.get("catalog_hash") == content_hash
+        and manifest.get("dtype") == dtype
+    ):
+        try:
+            return open_embeddings(directory, manifest)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Could not open embedding store {directory}: {e}")
+
+    hashes = row_hashes(texts)
+    ids = metadata["id"].tolist() if metadata is not None and "id" in metadata.columns else None
+    previous_rows, update = diff_rows(directory, manifest, hashes, ids=ids)
+
+    old_embeddings = None
+    if previous_rows is not None and update["reused"]:
+        try:
+            old_embeddings = open_embeddings(directory, manifest)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Could not open previous embeddings, re-encoding everything: {e}")
+
+    if old_embeddings is None:
+        print("🔹 Embedding store missing or stale, re-encoding catalog...")
+        previous_rows = np.full(len(texts), -1, dtype=np.int64)
+        update = {"added": len(texts), "changed": 0, "deleted": 0, "reused": 0}
+    else:
+        print(f"🔹 Incremental update: {update}")
+
+    pending = np.flatnonzero(previous_rows < 0)
+    embeddings = None
+    if len(pending):
+        if model is None:
+            model = load_model(model_name)
+        encoded = np.asarray(model.encode([texts[i] for i in pending], show_progress_bar=True), dtype=np.float32)
+        embeddings = np.empty((len(texts), encoded.shape[1]), dtype=np.float32)
+        embeddings[pending] = encoded
+    if old_embeddings is not None:
+        if embeddings is None:
+            embeddings = np.empty((len(texts), old_embeddings.shape[1]), dtype=np.float32)
+        kept = np.flatnonzero(previous_rows >= 0)
+        embeddings[kept] = old_embeddings[previous_rows[kept]]
+
+    directory, new_manifest = write_store(
+        embeddings, model_name, content_hash, metadata=metadata, dtype=dtype, root=root, hashes=hashes, update=update
+    )
+    print(f"✅ Saved embeddings → {directory}")
+
+    mapped = open_embeddings(directory, new_manifest)
+    if old_embeddings is not None:
+        _update_index(directory, manifest, new_manifest, mapped, previous_rows)
+    return mapped
+
+
+def encode_queries(model, queries, cache=query_embedding_cache) -> np.ndarray:
+    """
+    Encode one or more queries into a normalised float32 (n_queries, dim) matrix.
+    Texts already in `cache` are not re-encoded; the misses go through one encode call.
+    """
+    if isinstance(queries, str):
+        queries = [queries]
+    queries = list(queries)
+
+    if cache is None or cache.max_bytes <= 0:
+        vectors = np.asarray(model.encode(queries, normalize_embeddings=True), dtype=np.float32)
+        return vectors.reshape(len(queries), -1)
+
+    # Vectors depend on the encoder instance as well as the text
+    keys = [(id(model), q) for q in queries]
+    cached = [cache.get(key) for key in keys]
+
+    missing = list(dict.fromkeys(q for q, v in zip(queries, cached) if v is None))
+    if missing:
+        encoded = np.asarray(model.encode(missing, normalize_embeddings=True), dtype=np.float32)
+        encoded = encoded.reshape(len(missing), -1)
+        fresh = {}
+        for q, vector in zip(missing, encoded):
+            vector = vector.copy()
+            cache.put((id(model), q), vector)
+            fresh[q] = vector
+        cached = [v if v is not None else fresh[q] for q, v in zip(queries, cached)]
+
+    return np.stack(cached).astype(np.float32, copy=False)
+
+
+def get_index(embeddings, model_name=MODEL_NAME, kind=INDEX_TYPE, root=EMBEDDINGS_DIR, **params):
+    """
+    Return the retrieval index for the current store, building and persisting it
+    next to the vectors when it is missing or was built for another catalog / settings.
+    """
+    directory = store_dir(model_name, root)
+    manifest = read_manifest(directory) or {}
+
+    # Compared with the settings resolved now, so changing INDEX_TYPE / IVF_N_LISTS forces a rebuild
+    config = index_config(kind, **params)
+    entry = manifest.get("index") or {}
+    if (
+        entry.get("kind") == kind
+        and entry.get("catalog_hash") == manifest.get("catalog_hash")
+        and entry.get("config") == config
+        and os.path.exists(os.path.join(directory, entry.get("file", "")))
+    ):
+        try:
+            return load_index(os.path.join(directory, entry["file"]), embeddings, kind)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ Could not load {kind} index: {e}")
+
+    print(f"🔹 Building {kind} index over {len(embeddings)} vectors...")
+    index = build_index(embeddings, kind=kind, **{**params, **config})
+
+    if not manifest:
+        # No store on disk (embeddings came from elsewhere) - keep the index in memory only
+        return index
+
+    save_index(index, directory, manifest, config=config)
+    return index
+
+
+def save_index(index, directory, manifest, config=None):
+    """
+    Persist `index` for the store version in `manifest` and record it there,
+    with the `config` (see index_config) it was built with
+    """
+    version = manifest["catalog_hash"][:16]
+    index_file = f"index-{version}-{index.kind}.npz"
+    tmp_path = os.path.join(directory, f"{index_file}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        index.save(f)
+    os.replace(tmp_path, os.path.join(directory, index_file))
+
+    manifest["index"] = {
+        "kind": index.kind,
+        "file": index_file,
+        "catalog_hash": manifest["catalog_hash"],
+        "params": index.params(),
+        "config": config
+    }
+    _atomic_write_json(manifest, os.path.join(directory, "manifest.json"))
+
+    for old in glob.glob(os.path.join(directory, "index-*.npz")):
+        if os.path.basename(old) != index_file:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+
+def load_embeddings(catalog_path=CLEAN_DATA_PATH, model=None, model_name=MODEL_NAME):
+    """
+    Load catalog, model and corpus embeddings, rebuilding the store only on a hash mismatch
+    """
+    df = pd.read_csv(catalog_path)
+
+    if "combined_text" not in df.columns:
+        raise ValueError("combined_text column not found in cleaned data")
+
+    if model is None:
+        model = load_model(model_name)
+
+    embeddings = get_corpus_embeddings(
+        df["combined_text"].fillna("").tolist(),
+        model=model,
+        model_name=model_name,
+        metadata=catalog_metadata(df)
+    )
+    return df, model, embeddings
+
 
 def build_embeddings():
     print("🔹 Loading cleaned SHL catalog...")
@@ -17,32 +395,21 @@ def build_embeddings():
 
     texts = df["combined_text"].fillna("").tolist()
 
-    print("🔹 Loading SentenceTransformer model...")
-    model = SentenceTransformer("all-MiniLM-L6-v2")
-
-    print("🔹 Creating embeddings...")
-    embeddings = model.encode(texts, show_progress_bar=True)
-
-    os.makedirs("data/processed", exist_ok=True)
-
-    with open(EMBEDDINGS_PATH, "wb") as f:
-        pickle.dump(
-            {
-                "embeddings": embeddings,
-                "metadata": df[[
-                    "id",
-                    "assessment_name",
-                    "url",
-                    "remote",
-                    "adaptive",
-                    "test_type"
-                ]]
-            },
-            f
-        )
-
-    print(f"✅ Saved embeddings → {EMBEDDINGS_PATH}")
-    print(f"✅ Total embeddings created: {len(embeddings)}")
+    # Model is only loaded when the store is missing or stale
+    print("🔹 Checking embedding store...")
+    embeddings = get_corpus_embeddings(
+        texts,
+        metadata=df[METADATA_COLUMNS]
+    )
+
+    print(f"✅ Total embeddings in store: {len(embeddings)} ({embeddings.dtype})")
+
+    last_update = (read_manifest(store_dir()) or {}).get("last_update")
+    if last_update:
+        print(f"✅ Last update: {last_update}")
+
+    index = get_index(embeddings)
+    print(f"✅ {index.kind} index ready {index.params()}")
 
 if __name__ == "__main__":
     build_embeddings()
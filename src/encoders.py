@@ -0,0 +1,156 @@
+import os
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+try:
+    from src.embeddings import load_embeddings, MODEL_NAME
+    from src.index import ExactIndex
+except ImportError:
+    from embeddings import load_embeddings, MODEL_NAME
+    from index import ExactIndex
+
+# Query encoder backend: "torch" (full precision), "int8" (dynamic-quantized torch) or "onnx" (ONNX Runtime)
+ENCODER_BACKEND = os.getenv("ENCODER_BACKEND", "torch")
+ENCODER_BACKENDS = ["torch", "int8", "onnx"]
+
+# A backend whose vectors drift further than this from the stored corpus vectors is rejected
+ENCODER_PARITY_MIN_COSINE = float(os.getenv("ENCODER_PARITY_MIN_COSINE", "0.98"))
+PARITY_SAMPLE_SIZE = 64
+
+TRAIN_PATH = "data/train/trainset.xlsx"
+
+
+def load_encoder(model_name=MODEL_NAME, backend=ENCODER_BACKEND, base_model=None):
+    """
+    Query encoder for `backend`. Corpus vectors stay full-precision; only query encoding changes.
+    `base_model` (a loaded full-precision SentenceTransformer) is reused for torch / int8.
+    """
+    if backend not in ENCODER_BACKENDS:
+        raise ValueError(f"Unknown encoder backend: {backend} (expected one of {ENCODER_BACKENDS})")
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "onnx":
+        try:
+            return SentenceTransformer(model_name, device="cpu", backend="onnx")
+        except (ImportError, TypeError) as e:
+            raise RuntimeError(
+                "ONNX backend needs sentence-transformers>=3.2 with onnxruntime and optimum installed "
+                "(pip install 'sentence-transformers[onnx]')"
+            ) from e
+
+    model = base_model if base_model is not None else SentenceTransformer(model_name, device="cpu")
+    if backend == "torch":
+        return model
+
+    # Dynamic int8 quantization of every Linear layer; weights are quantized once, activations per call
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def parity_check(encoder, texts, corpus_embeddings, sample_size=PARITY_SAMPLE_SIZE):
+    """
+    Re-encode a sample of corpus texts with `encoder` and compare against the stored vectors.
+    Returns mean / min cosine and how often the stored vector is still the nearest neighbour.
+    """
+    n = len(texts)
+    sample = np.linspace(0, n - 1, min(sample_size, n)).astype(int)
+    encoded = np.asarray(encoder.encode([texts[i] for i in sample], normalize_embeddings=True), dtype=np.float32)
+    stored = np.asarray(corpus_embeddings[sample], dtype=np.float32)
+
+    cosine = (encoded * stored).sum(axis=1)
+    _, nearest = ExactIndex(corpus_embeddings).search(encoded, k=1)
+    return {
+        "samples": int(len(sample)),
+        "mean_cosine": float(cosine.mean()),
+        "min_cosine": float(cosine.min()),
+        "top1_agreement": float((nearest[:, 0] == sample).mean())
+    }
+
+
+def load_checked_encoder(texts, corpus_embeddings, backend=ENCODER_BACKEND, base_model=None, min_cosine=ENCODER_PARITY_MIN_COSINE):
+    """
+    load_encoder + parity check; falls back to the full-precision model when the backend drifts
+    or cannot be loaded
+    """
+    if backend == "torch":
+        return load_encoder(backend="torch", base_model=base_model)
+
+    try:
+        encoder = load_encoder(backend=backend, base_model=base_model)
+        parity = parity_check(encoder, texts, corpus_embeddings)
+    except Exception as e:
+        print(f"⚠️ {backend} encoder unavailable ({e}), using torch")
+        return load_encoder(backend="torch", base_model=base_model)
+
+    print(f"🔹 {backend} encoder parity: {parity}")
+    if parity["min_cosine"] < min_cosine:
+        print(f"⚠️ {backend} encoder below parity threshold {min_cosine}, using torch")
+        return load_encoder(backend="torch", base_model=base_model)
+    return encoder
+
+
+def benchmark(backends=ENCODER_BACKENDS, k=10, n_queries=200):
+    """
+    Per-query encode latency and Recall@k (overlap with full-precision top-k) for each backend
+    """
+    df, base_model, corpus_embeddings = load_embeddings()
+    texts = df["combined_text"].fillna("").tolist()
+    index = ExactIndex(corpus_embeddings)
+
+    if os.path.exists(TRAIN_PATH):
+        queries = pd.read_excel(TRAIN_PATH)["Query"].astype(str).drop_duplicates().tolist()
+    else:
+        queries = texts
+    queries = queries[:n_queries]
+
+    reference = None
+    rows = []
+    for backend in backends:
+        try:
+            encoder = load_encoder(backend=backend, base_model=base_model if backend == "torch" else None)
+        except Exception as e:
+            print(f"⚠️ Skipping {backend}: {e}")
+            continue
+
+        encoder.encode(queries[:1], normalize_embeddings=True)  # warm-up
+
+        latencies = []
+        vectors = []
+        for q in queries:
+            start = time.perf_counter()
+            vectors.append(encoder.encode([q], normalize_embeddings=True)[0])
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        _, top = index.search(np.asarray(vectors, dtype=np.float32), k=k)
+        if reference is None:
+            reference = top
+        recall = np.mean([len(set(a) & set(b)) / len(b) for a, b in zip(top.tolist(), reference.tolist())])
+
+        parity = parity_check(encoder, texts, corpus_embeddings)
+        rows.append({
+            "backend": backend,
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p95_ms": float(np.percentile(latencies, 95)),
+            f"recall@{k}_vs_torch": float(recall),
+            "parity_mean_cosine": parity["mean_cosine"],
+            "parity_min_cosine": parity["min_cosine"]
+        })
+
+    result = pd.DataFrame(rows)
+    print(result.to_string(index=False))
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark query encoder backends (latency + recall vs torch)")
+    parser.add_argument("--backends", nargs="+", default=ENCODER_BACKENDS, choices=ENCODER_BACKENDS)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    # torch first so it is the recall reference
+    backends = ["torch"] + [b for b in args.backends if b != "torch"]
+    benchmark(backends, k=args.k, n_queries=args.queries)
@@ -0,0 +1,187 @@
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+import httpx
+import pandas as pd
+from bs4 import BeautifulSoup
+from email.utils import formatdate
+from urllib.parse import urlparse
+
+INPUT_PATH = "data/raw/shl_catalog_raw.csv"
+OUTPUT_PATH = "data/raw/shl_catalog_enriched.csv"
+
+# One JSON file per detail URL: validators (ETag / Last-Modified) + parsed fields
+CACHE_DIR = "data/cache/detail_pages"
+
+# Bounded pool: at most ENRICH_CONCURRENCY requests in flight, over as many kept-alive connections
+ENRICH_CONCURRENCY = int(os.getenv("ENRICH_CONCURRENCY", "8"))
+ENRICH_TIMEOUT_SECONDS = float(os.getenv("ENRICH_TIMEOUT_SECONDS", "20"))
+ENRICH_RETRIES = 2
+
+# Rewrites the scheme + host of every detail URL, e.g. to a local fixture server
+ENRICH_BASE_URL = os.getenv("ENRICH_BASE_URL")
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+
+ENRICHED_COLUMNS = ["description", "duration", "skills", "job_levels", "languages"]
+
+
+def cache_path(url: str, cache_dir=CACHE_DIR) -> str:
+    return os.path.join(cache_dir, hashlib.sha1(url.encode("utf-8")).hexdigest() + ".json")
+
+
+def read_cache(url: str, cache_dir=CACHE_DIR):
+    path = cache_path(url, cache_dir)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_cache(entry: dict, cache_dir=CACHE_DIR):
+    os.makedirs(cache_dir, exist_ok=True)
+    path = cache_path(entry["url"], cache_dir)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(entry, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def fetch_url(url: str, base_url=ENRICH_BASE_URL) -> str:
+    if not base_url:
+        return url
+    parsed = urlparse(url)
+    return base_url.rstrip("/") + parsed.path + (f"?{parsed.query}" if parsed.query else "")
+
+
+def _section_text(node) -> str:
+    return " ".join(node.get_text(" ", strip=True).split())
+
+
+def parse_detail_page(html: str) -> dict:
+    """
+    Description, duration (minutes), skills, job levels and languages from a product page.
+    Each field sits under an <h4> heading; the text after it up to the next heading is its value.
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    sections = {}
+    for heading in soup.find_all("h4"):
+        parts = []
+        for sibling in heading.find_next_siblings():
+            if sibling.name == "h4":
+                break
+            parts.append(_section_text(sibling))
+        sections[heading.get_text(strip=True).lower()] = " ".join(p for p in parts if p)
+
+    length = sections.get("assessment length", "")
+    minutes = re.search(r"(\d+)", length)
+
+    def listed(value):
+        return ", ".join(part.strip() for part in value.rstrip(",").split(",") if part.strip())
+
+    return {
+        "description": sections.get("description", ""),
+        "duration": int(minutes.group(1)) if minutes else None,
+        "skills": listed(sections.get("skills", "") or sections.get("knowledge, skills & abilities", "")),
+        "job_levels": listed(sections.get("job levels", "")),
+        "languages": listed(sections.get("languages", "")),
+    }
+
+
+async def fetch_detail(client, semaphore, url: str, stats: dict, cache_dir=CACHE_DIR) -> dict:
+    """
+    Conditional GET against the cached validators; 304 reuses the cached fields
+    """
+    cached = read_cache(url, cache_dir)
+    headers = {}
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    async with semaphore:
+        for attempt in range(ENRICH_RETRIES + 1):
+            try:
+                resp = await client.get(fetch_url(url), headers=headers)
+                break
+            except httpx.HTTPError as e:
+                if attempt == ENRICH_RETRIES:
+                    stats["failed"] += 1
+                    print(f"⚠️ {url}: {e}")
+                    return cached["fields"] if cached else {}
+                await asyncio.sleep(0.5 * (attempt + 1))
+
+    if resp.status_code == 304 and cached:
+        stats["not_modified"] += 1
+        return cached["fields"]
+
+    if resp.status_code != 200:
+        stats["failed"] += 1
+        print(f"⚠️ {url}: HTTP {resp.status_code}")
+        return cached["fields"] if cached else {}
+
+    fields = parse_detail_page(resp.text)
+    write_cache({
+        "url": url,
+        "etag": resp.headers.get("ETag"),
+        "last_modified": resp.headers.get("Last-Modified"),
+        "fetched_at": formatdate(time.time(), usegmt=True),
+        "fields": fields
+    }, cache_dir)
+    stats["fetched"] += 1
+    return fields
+
+
+async def enrich_urls(urls, concurrency=ENRICH_CONCURRENCY, cache_dir=CACHE_DIR):
+    """
+    {url: fields} for every unique detail URL, fetched over one pooled async client
+    """
+    urls = list(dict.fromkeys(u for u in urls if isinstance(u, str) and u))
+    stats = {"urls": len(urls), "fetched": 0, "not_modified": 0, "failed": 0}
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(
+        limits=limits,
+        timeout=ENRICH_TIMEOUT_SECONDS,
+        follow_redirects=True,
+        headers={"User-Agent": USER_AGENT}
+    ) as client:
+        results = await asyncio.gather(*(fetch_detail(client, semaphore, u, stats, cache_dir) for u in urls))
+
+    return dict(zip(urls, results)), stats
+
+
+def enrich_catalog(input_path=INPUT_PATH, output_path=OUTPUT_PATH, concurrency=ENRICH_CONCURRENCY, cache_dir=CACHE_DIR):
+    df = pd.read_csv(input_path)
+
+    print(f"🔹 Enriching {len(df)} catalog rows from detail pages...")
+    start = time.perf_counter()
+    details, stats = asyncio.run(enrich_urls(df["url"].tolist(), concurrency, cache_dir))
+    print(f"✅ Detail pages: {stats} in {time.perf_counter() - start:.1f}s")
+
+    for column in ENRICHED_COLUMNS:
+        df[column] = [details.get(url, {}).get(column) for url in df["url"]]
+    df["duration"] = pd.array(df["duration"], dtype="Int64")
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    df.to_csv(output_path, index=False)
+    print(f"Saved enriched catalog → {output_path}")
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Enrich the crawled catalog with product detail pages")
+    parser.add_argument("--concurrency", type=int, default=ENRICH_CONCURRENCY)
+    parser.add_argument("--input", default=INPUT_PATH)
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    args = parser.parse_args()
+    enrich_catalog(args.input, args.output, args.concurrency)
@@ -1,12 +1,29 @@
+import os
+import time
+import asyncio
+import argparse
+import numpy as np
 import pandas as pd
-from recommender import recommend_assessments
+from functools import lru_cache
 from urllib.parse import urlparse, urlunparse
-import re
+
+import recommender
+from embeddings import encode_queries
+from cache import TTLCache
+from lexical import load_lexical_index, hybrid_search
+from llm import AsyncLLMClient, GeminiBackend, HTTPStubBackend, build_rewrite_prompt, rewrite_cache_key, GEMINI_MODEL_NAME, LLM_STUB_URL
 
 TRAIN_PATH = "data/train/trainset.xlsx"
 K = 10
+KS = [1, 3, 5, 10]
+
+# Rewrites persist here, so re-running an experiment never calls the LLM twice for a query
+EVAL_REWRITE_CACHE_PATH = "data/cache/eval_rewrites.sqlite"
+EVAL_REWRITE_TTL_SECONDS = 30 * 24 * 3600
+EVAL_LLM_CONCURRENCY = int(os.getenv("EVAL_LLM_CONCURRENCY", "8"))
 
 
+@lru_cache(maxsize=None)
 def normalize_url(url: str) -> str:
     """
     Normalize URL for comparison:
@@ -17,14 +34,14 @@ def normalize_url(url: str) -> str:
     """
     if not url or pd.isna(url):
         return ""
-    
+
     url = str(url).strip()
     if not url:
         return ""
-    
+
     # Parse URL
     parsed = urlparse(url.lower())
-    
+
     # Reconstruct without query/fragment, normalize scheme
     normalized = urlunparse((
         parsed.scheme or "https",  # Default to https
@@ -34,7 +51,7 @@ def normalize_url(url: str) -> str:
         "",  # query
         ""   # fragment
     ))
-    
+
     return normalized
 
 
@@ -60,93 +77,173 @@ def recall_at_k(predicted, relevant, k):
     return hits / len(relevant_set)
 
 
-def evaluate_mean_recall():
-    train_df = pd.read_excel(TRAIN_PATH)
+def average_precision_at_k(predicted, relevant, k):
+    relevant_set = set(relevant)
+    if not relevant_set:
+        return 0.0
+    hits, total = 0, 0.0
+    for rank, p in enumerate(predicted[:k], 1):
+        if p in relevant_set:
+            hits += 1
+            total += hits / rank
+    return total / min(len(relevant_set), k)
+
+
+def ndcg_at_k(predicted, relevant, k):
+    relevant_set = set(relevant)
+    if not relevant_set:
+        return 0.0
+    dcg = sum(1.0 / np.log2(rank + 1) for rank, p in enumerate(predicted[:k], 1) if p in relevant_set)
+    ideal = sum(1.0 / np.log2(rank + 1) for rank in range(1, min(len(relevant_set), k) + 1))
+    return dcg / ideal
+
+
+def score_all(predictions, relevants, ks=KS) -> dict:
+    """
+    Mean Recall@K, MAP@K and nDCG@K for every K in one pass over the queries
+    """
+    totals = {k: {"recall": 0.0, "map": 0.0, "ndcg": 0.0} for k in ks}
+    for predicted, relevant in zip(predictions, relevants):
+        for k in ks:
+            totals[k]["recall"] += recall_at_k(predicted, relevant, k)
+            totals[k]["map"] += average_precision_at_k(predicted, relevant, k)
+            totals[k]["ndcg"] += ndcg_at_k(predicted, relevant, k)
+    n = max(len(predictions), 1)
+    return {k: {name: value / n for name, value in metrics.items()} for k, metrics in totals.items()}
+
 
+def load_ground_truth(path=TRAIN_PATH, query_col="Query", url_col="Assessment_url"):
+    """
+    Unique queries (first-seen order) with the set of normalised relevant URLs each.
+    Rows repeating a query are merged, so every query is scored once against all its labels.
+    """
+    train_df = pd.read_excel(path)
     print("Available columns:", train_df.columns.tolist())
     print("Rows:", len(train_df))
 
-    query_col = "Query"
-    url_col = "Assessment_url"
-
-    recalls = []
-    debug_samples = []
-
-    for idx, row in train_df.iterrows():
-        query = str(row[query_col]).strip()
-        
-        # Parse and normalize relevant URLs
-        relevant_urls_raw = str(row[url_col]).split(",")
-        relevant_urls = [normalize_url(u) for u in relevant_urls_raw if u.strip()]
-        
-        if not relevant_urls:
-            continue
-
-        # Get predictions
-        predicted_urls_raw = recommend_assessments(query, top_k=K)
-        predicted_urls = [normalize_url(u) for u in predicted_urls_raw]
-
-        # Store first 3 examples for detailed debugging
-        if len(debug_samples) < 3:
-            # Also try fuzzy matching by slug
-            relevant_slugs = [extract_url_slug(u) for u in relevant_urls]
-            predicted_slugs = [extract_url_slug(u) for u in predicted_urls]
-            slug_hits = sum(1 for p_slug in predicted_slugs if p_slug in set(relevant_slugs))
-            
-            debug_samples.append({
-                "query": query,
-                "relevant_raw": relevant_urls_raw[:3],
-                "relevant_normalized": relevant_urls[:3],
-                "predicted_raw": predicted_urls_raw[:3],
-                "predicted_normalized": predicted_urls[:3],
-                "exact_hits": sum(1 for p in predicted_urls if p in set(relevant_urls)),
-                "slug_hits": slug_hits
-            })
-
-        r = recall_at_k(predicted_urls, relevant_urls, K)
-        recalls.append(r)
-
-        if (idx + 1) % 10 == 0:
-            print(f"Processed {idx + 1}/{len(train_df)}")
-
-    if not recalls:
-        print("❌ No valid rows for evaluation")
-        return
+    relevant = {}
+    for query, urls in zip(train_df[query_col].astype(str).str.strip(), train_df[url_col].astype(str)):
+        labels = [normalize_url(u) for u in urls.split(",") if u.strip()]
+        relevant.setdefault(query, [])
+        relevant[query].extend(u for u in labels if u and u not in relevant[query])
+
+    queries = [q for q, urls in relevant.items() if urls]
+    return queries, [relevant[q] for q in queries]
+
+
+# ---------------- LLM variant ----------------
+async def _rewrite_all(queries, concurrency, cache_path):
+    cache = TTLCache(maxsize=max(len(queries), 1), ttl=EVAL_REWRITE_TTL_SECONDS, persist_path=cache_path)
+    if LLM_STUB_URL:
+        backend = HTTPStubBackend(LLM_STUB_URL)
+    else:
+        import google.generativeai as genai
+        from dotenv import load_dotenv
 
-    # Print detailed debug samples
+        load_dotenv()
+        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+        backend = GeminiBackend(genai.GenerativeModel(GEMINI_MODEL_NAME))
+
+    client = AsyncLLMClient(
+        backend,
+        prompt_fn=build_rewrite_prompt,
+        cache=cache,
+        key_fn=rewrite_cache_key,
+        max_concurrency=concurrency
+    )
+
+    async def rewrite(query):
+        try:
+            return await client.rewrite(query)
+        except Exception as e:
+            print(f"⚠️ Rewrite failed, using raw query: {query[:60]}... ({e})")
+            return query
+
+    rewritten = await asyncio.gather(*(rewrite(q) for q in queries))
+    await client.flush()
+    return rewritten, {**cache.stats(), "llm_calls": client.calls}
+
+
+def rewrite_queries(queries, concurrency=EVAL_LLM_CONCURRENCY, cache_path=EVAL_REWRITE_CACHE_PATH):
+    return asyncio.run(_rewrite_all(queries, concurrency, cache_path))
+
+
+# ---------------- Retrieval ----------------
+def retrieve(queries, k=K, mode="dense"):
+    """
+    One batched encode and one matrix search for every query -> list of normalised URL lists
+    """
+    df_catalog, model, _, corpus_index = recommender.load()
+    catalog_urls = [normalize_url(u) for u in df_catalog["url"].tolist()]
+
+    query_embeddings = encode_queries(model, queries)
+    if mode == "hybrid":
+        lexical_index = load_lexical_index(df_catalog["combined_text"].fillna("").tolist())
+        _, indices = hybrid_search(queries, query_embeddings, corpus_index, lexical_index, k=k)
+    else:
+        _, indices = corpus_index.search(query_embeddings, k=k)
+
+    return [[catalog_urls[i] for i in row if i >= 0] for row in indices.tolist()]
+
+
+def print_debug_samples(queries, raw_queries, predictions, relevants, n=3, k=K):
     print("\n" + "="*80)
-    print("🔍 DETAILED DEBUG: First 3 examples")
+    print(f"🔍 DETAILED DEBUG: First {n} examples")
     print("="*80)
-    for i, sample in enumerate(debug_samples, 1):
-        print(f"\n📋 Example {i}:")
-        print(f"  Query: {sample['query']}")
-        print(f"\n  📌 Relevant URLs (RAW from train data):")
-        for j, url in enumerate(sample['relevant_raw'][:3], 1):
-            print(f"    {j}. {url}")
+    for i in range(min(n, len(queries))):
+        predicted, relevant = predictions[i][:k], relevants[i]
+        relevant_slugs = {extract_url_slug(u) for u in relevant}
+        print(f"\n📋 Example {i + 1}:")
+        print(f"  Query: {raw_queries[i]}")
+        if queries[i] != raw_queries[i]:
+            print(f"  Rewritten: {queries[i]}")
         print(f"\n  📌 Relevant URLs (NORMALIZED):")
-        for j, url in enumerate(sample['relevant_normalized'][:3], 1):
-            print(f"    {j}. {url}")
-        print(f"\n  🤖 Predicted URLs (RAW from recommender):")
-        for j, url in enumerate(sample['predicted_raw'][:3], 1):
+        for j, url in enumerate(relevant[:3], 1):
             print(f"    {j}. {url}")
         print(f"\n  🤖 Predicted URLs (NORMALIZED):")
-        for j, url in enumerate(sample['predicted_normalized'][:3], 1):
+        for j, url in enumerate(predicted[:3], 1):
             print(f"    {j}. {url}")
-        print(f"\n  ✅ Exact URL matches in top-{K}: {sample['exact_hits']}")
-        print(f"  🔗 Slug matches in top-{K}: {sample['slug_hits']}")
+        print(f"\n  ✅ Exact URL matches in top-{k}: {sum(1 for p in predicted if p in set(relevant))}")
+        print(f"  🔗 Slug matches in top-{k}: {sum(1 for p in predicted if extract_url_slug(p) in relevant_slugs)}")
 
-    mean_recall = sum(recalls) / len(recalls)
+
+def evaluate_mean_recall(ks=KS, mode="dense", use_llm=False, concurrency=EVAL_LLM_CONCURRENCY):
+    raw_queries, relevants = load_ground_truth()
+    if not raw_queries:
+        print("❌ No valid rows for evaluation")
+        return
+
+    queries = raw_queries
+    if use_llm:
+        start = time.perf_counter()
+        queries, rewrite_stats = rewrite_queries(raw_queries, concurrency)
+        print(f"🔹 Rewrote {len(queries)} queries in {time.perf_counter() - start:.1f}s {rewrite_stats}")
+
+    start = time.perf_counter()
+    predictions = retrieve(queries, k=max(ks), mode=mode)
+    print(f"🔹 Retrieved top-{max(ks)} for {len(queries)} queries in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    print_debug_samples(queries, raw_queries, predictions, relevants)
+
+    results = score_all(predictions, relevants, ks)
     print(f"\n" + "="*80)
-    print(f"✅ Mean Recall@{K}: {mean_recall:.4f}")
-    print(f"Evaluated on {len(recalls)} queries")
-    
+    print(f"Mode: {mode}{' + LLM rewrite' if use_llm else ''} | Evaluated on {len(queries)} queries")
+    print(pd.DataFrame(results).T.rename_axis("K").to_string(float_format=lambda v: f"{v:.4f}"))
+
     # Show recall distribution
     recall_counts = {}
-    for r in recalls:
-        bucket = f"{int(r * 10) * 10}%"
+    for predicted, relevant in zip(predictions, relevants):
+        bucket = f"{int(recall_at_k(predicted, relevant, K) * 10) * 10}%"
         recall_counts[bucket] = recall_counts.get(bucket, 0) + 1
-    print(f"\nRecall distribution: {recall_counts}")
+    print(f"\nRecall@{K} distribution: {recall_counts}")
+    return results
 
 
 if __name__ == "__main__":
-    evaluate_mean_recall()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Offline evaluation: Recall@K, MAP@K and nDCG@K on the train set")
+    parser.add_argument("--k", type=int, nargs="+", default=KS)
+    parser.add_argument("--mode", choices=["dense", "hybrid"], default="dense")
+    parser.add_argument("--llm", action="store_true", help="rewrite queries with the LLM first (cached on disk)")
+    parser.add_argument("--concurrency", type=int, default=EVAL_LLM_CONCURRENCY)
+    args = parser.parse_args()
+    evaluate_mean_recall(sorted(set(args.k)), mode=args.mode, use_llm=args.llm, concurrency=args.concurrency)
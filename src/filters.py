@@ -0,0 +1,115 @@
+import re
+import numpy as np
+import pandas as pd
+
+# Test-type key letters as shown in the SHL catalogue (see src/ingestion.py)
+KEY_MAP = {
+    "A": "Ability & Aptitude",
+    "B": "Biodata & Situational Judgement",
+    "C": "Competencies",
+    "D": "Development & 360",
+    "E": "Assessment Exercises",
+    "K": "Knowledge & Skills",
+    "P": "Personality & Behavior",
+    "S": "Simulations",
+}
+NAME_TO_KEY = {name.lower(): key for key, name in KEY_MAP.items()}
+
+# Column names across the processed catalog and the older export format
+REMOTE_COLUMNS = ["remote", "remote_testing_support", "Remote Testing Support"]
+ADAPTIVE_COLUMNS = ["adaptive", "adaptive_irt", "Adaptive/IRT"]
+TEST_TYPE_KEY_COLUMNS = ["test_type_keys"]
+TEST_TYPE_COLUMNS = ["test_type", "Test Type"]
+DURATION_COLUMNS = ["duration", "Duration"]
+
+
+def _first_column(df, candidates):
+    for col in candidates:
+        if col in df.columns:
+            return df[col]
+    return None
+
+
+def _yes(values) -> np.ndarray:
+    return values.fillna("").astype(str).str.strip().str.lower().isin(["yes", "y", "true", "1"]).to_numpy()
+
+
+def _duration_minutes(values) -> np.ndarray:
+    # "30", "30 minutes", "Approximate Completion Time in minutes = 30" -> 30.0; unknown -> NaN
+    extracted = values.astype(str).str.extract(r"(\d+(?:\.\d+)?)")[0]
+    return pd.to_numeric(extracted, errors="coerce").to_numpy(dtype=np.float32)
+
+
+def resolve_test_type(value: str) -> str:
+    """
+    Accepts a key letter ("P") or a full name ("Personality & Behavior")
+    """
+    value = str(value).strip()
+    if value.upper() in KEY_MAP:
+        return value.upper()
+    key = NAME_TO_KEY.get(value.lower())
+    if key is None:
+        raise ValueError(f"Unknown test type: {value} (expected one of {list(KEY_MAP)} or {list(KEY_MAP.values())})")
+    return key
+
+
+class FilterIndex:
+    """
+    Precomputed boolean columns over the catalog so structured constraints
+    (remote, adaptive, test type, duration) become a few vectorised ANDs.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.n_rows = len(df)
+        empty = pd.Series([""] * self.n_rows, index=df.index)
+
+        remote = _first_column(df, REMOTE_COLUMNS)
+        adaptive = _first_column(df, ADAPTIVE_COLUMNS)
+        self.remote = _yes(remote if remote is not None else empty)
+        self.adaptive = _yes(adaptive if adaptive is not None else empty)
+
+        # One bitmap per test-type key, from the key letters or (fallback) the full names
+        keys = _first_column(df, TEST_TYPE_KEY_COLUMNS)
+        if keys is not None:
+            key_sets = [set(re.split(r"\s*,\s*", str(v).strip())) if pd.notna(v) else set() for v in keys]
+        else:
+            names = _first_column(df, TEST_TYPE_COLUMNS)
+            names = names if names is not None else empty
+            key_sets = [
+                {NAME_TO_KEY.get(n.strip().lower(), "") for n in str(v).split(",")} if pd.notna(v) else set()
+                for v in names
+            ]
+        self.test_types = {
+            key: np.fromiter((key in s for s in key_sets), dtype=bool, count=self.n_rows)
+            for key in KEY_MAP
+        }
+
+        duration = _first_column(df, DURATION_COLUMNS)
+        self.duration = _duration_minutes(duration) if duration is not None else np.full(self.n_rows, np.nan, dtype=np.float32)
+
+    def mask(self, remote=None, adaptive=None, test_types=None, max_duration=None, min_duration=None):
+        """
+        Boolean eligibility mask, or None when no constraint is set.
+        test_types matches rows having ANY of the given types.
+        Rows with unknown duration never satisfy a duration constraint.
+        """
+        mask = None
+
+        def _and(current, other):
+            return other.copy() if current is None else current & other
+
+        if remote is not None:
+            mask = _and(mask, self.remote if remote else ~self.remote)
+        if adaptive is not None:
+            mask = _and(mask, self.adaptive if adaptive else ~self.adaptive)
+        if test_types:
+            any_type = np.zeros(self.n_rows, dtype=bool)
+            for value in test_types:
+                any_type |= self.test_types[resolve_test_type(value)]
+            mask = _and(mask, any_type)
+        if max_duration is not None:
+            mask = _and(mask, self.duration <= max_duration)
+        if min_duration is not None:
+            mask = _and(mask, self.duration >= min_duration)
+
+        return mask
@@ -1,31 +1,110 @@
+import os
+import csv
+import json
+import argparse
 import pandas as pd
-from recommender import recommend_assessments
+from recommender import recommend_assessments_batch
 
 TEST_PATH = "data/test/test.xlsx"
 OUTPUT_PATH = "data/outputs/test_predictions.csv"
 TOP_K = 10
 
-def generate_predictions():
-    df_test = pd.read_excel(TEST_PATH, sheet_name="Test-Set")
+# Queries encoded + scored per step; rows are flushed to disk after every chunk
+CHUNK_SIZE = int(os.getenv("PREDICT_CHUNK_SIZE", "256"))
 
-    rows = []
 
-    for _, row in df_test.iterrows():
-        query = str(row["Query"]).strip()
+def progress_path(output_path: str) -> str:
+    return output_path + ".progress"
 
-        predicted_urls = recommend_assessments(query, top_k=TOP_K)
 
-        for url in predicted_urls:
-            rows.append({
-                "Query": query,
-                "Assessment_url": url
-            })
+def read_progress(output_path: str) -> dict:
+    """
+    {"queries_done": n, "bytes": size of the output file after those n queries}
+    """
+    path = progress_path(output_path)
+    if not os.path.exists(path) or not os.path.exists(output_path):
+        return {"queries_done": 0, "bytes": 0}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
 
-    out_df = pd.DataFrame(rows)
-    out_df.to_csv(OUTPUT_PATH, index=False)
 
-    print(f"✅ Saved predictions → {OUTPUT_PATH}")
-    print(f"Total rows: {len(out_df)}")
+def write_progress(output_path: str, queries_done: int, size: int):
+    path = progress_path(output_path)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"queries_done": queries_done, "bytes": size}, f)
+    os.replace(tmp_path, path)
+
+
+def iter_query_chunks(input_path: str, chunk_size: int, sheet_name="Test-Set", query_col="Query"):
+    """
+    Query lists of at most chunk_size; CSV inputs are read chunk by chunk, xlsx in one go
+    """
+    if input_path.lower().endswith(".csv"):
+        for chunk in pd.read_csv(input_path, usecols=[query_col], chunksize=chunk_size):
+            yield chunk[query_col].astype(str).str.strip().tolist()
+        return
+
+    queries = pd.read_excel(input_path, sheet_name=sheet_name)[query_col].astype(str).str.strip().tolist()
+    for start in range(0, len(queries), chunk_size):
+        yield queries[start:start + chunk_size]
+
+
+def generate_predictions(input_path=TEST_PATH, output_path=OUTPUT_PATH, top_k=TOP_K, chunk_size=CHUNK_SIZE, fresh=False, sheet_name="Test-Set"):
+    """
+    Stream Query,Assessment_url rows to `output_path` chunk by chunk. An interrupted
+    run resumes after the last flushed chunk (a torn tail is truncated first).
+    """
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+
+    if fresh and os.path.exists(progress_path(output_path)):
+        os.remove(progress_path(output_path))
+    progress = read_progress(output_path)
+    skip = progress["queries_done"]
+    if skip:
+        print(f"🔁 Resuming after {skip} queries")
+
+    with open(output_path, "a+" if skip else "w", newline="", encoding="utf-8") as f:
+        if skip:
+            f.truncate(progress["bytes"])
+            f.seek(0, os.SEEK_END)
+        writer = csv.writer(f)
+        if not skip:
+            writer.writerow(["Query", "Assessment_url"])
+
+        done = 0
+        rows = 0
+        for queries in iter_query_chunks(input_path, chunk_size, sheet_name=sheet_name):
+            if done + len(queries) <= skip:
+                done += len(queries)
+                continue
+            queries = queries[max(skip - done, 0):]
+            done = max(done, skip)
+
+            for query, urls in zip(queries, recommend_assessments_batch(queries, top_k=top_k)):
+                writer.writerows([query, url] for url in urls)
+                rows += len(urls)
+
+            f.flush()
+            os.fsync(f.fileno())
+            done += len(queries)
+            write_progress(output_path, done, f.tell())
+            print(f"Processed {done} queries")
+
+    # Finished: the next run starts a fresh file
+    if os.path.exists(progress_path(output_path)):
+        os.remove(progress_path(output_path))
+    print(f"✅ Saved predictions → {output_path}")
+    print(f"Rows written this run: {rows}")
+
 
 if __name__ == "__main__":
-    generate_predictions()
+    parser = argparse.ArgumentParser(description="Write top-K assessment URLs for every query in a test / requisition file")
+    parser.add_argument("--input", default=TEST_PATH, help=".xlsx (sheet --sheet) or .csv with a Query column")
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    parser.add_argument("--sheet", default="Test-Set")
+    parser.add_argument("--top-k", type=int, default=TOP_K)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--fresh", action="store_true", help="ignore previous progress and overwrite the output")
+    args = parser.parse_args()
+    generate_predictions(args.input, args.output, args.top_k, args.chunk_size, fresh=args.fresh, sheet_name=args.sheet)
@@ -0,0 +1,268 @@
+import os
+import numpy as np
+
+# Retrieval index backends: "exact" (brute-force cosine) or "ivf" (IVF-flat ANN)
+INDEX_TYPE = os.getenv("INDEX_TYPE", "exact")
+
+# IVF-flat recall/speed knobs: more lists = smaller scans, more probes = higher recall
+IVF_N_LISTS = int(os.getenv("IVF_N_LISTS", "0"))  # 0 = sqrt(n_rows)
+IVF_N_PROBE = int(os.getenv("IVF_N_PROBE", "8"))
+IVF_TRAIN_ITERATIONS = 10
+IVF_MAX_TRAIN_POINTS_PER_LIST = 256
+# Incremental updates keep the trained centroids unless more than this share of rows is new
+IVF_RETRAIN_FRACTION = float(os.getenv("IVF_RETRAIN_FRACTION", "0.2"))
+
+# Rows scored per block when the store is float16 (bounds the temporary float32 copy)
+SCORE_CHUNK_ROWS = 65536
+
+
+def cosine_scores(query_embeddings, embeddings, chunk_size=SCORE_CHUNK_ROWS) -> np.ndarray:
+    """
+    Cosine similarity of normalised queries against the (mapped) normalised corpus.
+    float32 stores are multiplied in place; float16 stores are upcast one chunk at a time.
+    """
+    query_embeddings = np.asarray(query_embeddings, dtype=np.float32)
+    if query_embeddings.ndim == 1:
+        query_embeddings = query_embeddings[None, :]
+
+    if embeddings.dtype == np.float32:
+        return query_embeddings @ embeddings.T
+
+    scores = np.empty((len(query_embeddings), len(embeddings)), dtype=np.float32)
+    for start in range(0, len(embeddings), chunk_size):
+        block = np.asarray(embeddings[start:start + chunk_size], dtype=np.float32)
+        scores[:, start:start + len(block)] = query_embeddings @ block.T
+    return scores
+
+
+def top_k(scores, k):
+    """
+    Row-wise top-k over a (n_queries, n) score matrix, sorted by descending score
+    """
+    scores = np.atleast_2d(scores)
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.empty((len(scores), 0), dtype=np.float32), np.empty((len(scores), 0), dtype=np.int64)
+
+    idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    part = np.take_along_axis(scores, idx, axis=1)
+    order = np.argsort(-part, axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(idx, order, axis=1)
+
+
+class ExactIndex:
+    """
+    Brute-force cosine search over every row (the original behaviour)
+    """
+    kind = "exact"
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+
+    def __len__(self):
+        return len(self.embeddings)
+
+    def params(self):
+        return {}
+
+    def search(self, query_embeddings, k=10, mask=None, **kwargs):
+        """
+        Returns (scores, indices), each (n_queries, k), best first.
+        `mask` (n_rows,) or (n_queries, n_rows) restricts results to eligible rows;
+        a shared 1-D mask means only the eligible subset is scored at all.
+        """
+        if mask is None:
+            return top_k(cosine_scores(query_embeddings, self.embeddings), k)
+
+        mask = np.asarray(mask, dtype=bool)
+        if mask.ndim == 1:
+            ids = np.flatnonzero(mask)
+            values, local = top_k(cosine_scores(query_embeddings, self.embeddings[ids]), k)
+            return values, ids[local]
+
+        # Per-query masks: score the union of eligible rows once, knock out the rest per query
+        ids = np.flatnonzero(mask.any(axis=0))
+        scores = np.where(mask[:, ids], cosine_scores(query_embeddings, self.embeddings[ids]), -np.inf)
+        values, local = top_k(scores, k)
+        indices = ids[local]
+        indices[np.isneginf(values)] = -1
+        return values, indices
+
+    def update(self, embeddings, previous_rows):
+        return ExactIndex(embeddings)
+
+    def save(self, path):
+        np.savez(path, kind=np.array(self.kind))
+
+    @classmethod
+    def load(cls, path, embeddings):
+        return cls(embeddings)
+
+
+class IVFFlatIndex:
+    """
+    Inverted-file ANN index: vectors are bucketed by their nearest k-means
+    centroid and a query only scores the rows of its `n_probe` closest buckets.
+    Vectors themselves stay in the shared (memory-mapped) embedding matrix.
+    """
+    kind = "ivf"
+
+    def __init__(self, embeddings, centroids, list_offsets, list_ids, n_probe=IVF_N_PROBE):
+        self.embeddings = embeddings
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_ids = list_ids
+        self.n_probe = n_probe
+
+    def __len__(self):
+        return len(self.embeddings)
+
+    def params(self):
+        return {"n_lists": int(len(self.centroids))}
+
+    @classmethod
+    def build(cls, embeddings, n_lists=IVF_N_LISTS, n_probe=IVF_N_PROBE, iterations=IVF_TRAIN_ITERATIONS, seed=0):
+        n_rows = len(embeddings)
+        if n_lists <= 0:
+            n_lists = int(np.sqrt(n_rows))
+        n_lists = max(1, min(n_lists, n_rows))
+
+        rng = np.random.default_rng(seed)
+
+        # Train spherical k-means on a sample, then assign every row
+        n_train = min(n_rows, n_lists * IVF_MAX_TRAIN_POINTS_PER_LIST)
+        train = np.asarray(embeddings[np.sort(rng.choice(n_rows, n_train, replace=False))], dtype=np.float32)
+        centroids = train[rng.choice(n_train, n_lists, replace=False)].copy()
+
+        for _ in range(iterations):
+            assign = cosine_scores(train, centroids).argmax(axis=1)
+            for c in range(n_lists):
+                members = train[assign == c]
+                if len(members) == 0:
+                    centroids[c] = train[rng.integers(n_train)]
+                    continue
+                centroid = members.sum(axis=0)
+                centroids[c] = centroid / max(np.linalg.norm(centroid), 1e-12)
+
+        assign = np.empty(n_rows, dtype=np.int64)
+        for start in range(0, n_rows, SCORE_CHUNK_ROWS):
+            block = embeddings[start:start + SCORE_CHUNK_ROWS]
+            assign[start:start + len(block)] = cosine_scores(block, centroids).argmax(axis=1)
+
+        list_ids = np.argsort(assign, kind="stable").astype(np.int64)
+        list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=n_lists))]).astype(np.int64)
+
+        return cls(embeddings, centroids, list_offsets, list_ids, n_probe=n_probe)
+
+    def candidates(self, query_embedding, n_probe):
+        centroid_scores = self.centroids @ query_embedding
+        n_probe = min(n_probe, len(self.centroids))
+        probe = np.argpartition(-centroid_scores, n_probe - 1)[:n_probe]
+        return np.concatenate([self.list_ids[self.list_offsets[c]:self.list_offsets[c + 1]] for c in probe])
+
+    def search(self, query_embeddings, k=10, n_probe=None, mask=None, **kwargs):
+        """
+        Returns (scores, indices), each (n_queries, k), best first.
+        Slots with fewer than k candidates are padded with index -1.
+        `mask` (n_rows,) or (n_queries, n_rows) drops ineligible rows from the probed lists.
+        """
+        query_embeddings = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        n_probe = n_probe or self.n_probe
+        if mask is not None:
+            mask = np.asarray(mask, dtype=bool)
+            if mask.ndim == 1:
+                mask = np.broadcast_to(mask, (len(query_embeddings), len(mask)))
+
+        out_scores = np.full((len(query_embeddings), k), -np.inf, dtype=np.float32)
+        out_indices = np.full((len(query_embeddings), k), -1, dtype=np.int64)
+
+        # Rows an unfiltered probe scans on average; a more selective filter is cheaper to score exactly
+        expected_scan = len(self.embeddings) * min(n_probe, len(self.centroids)) / max(len(self.centroids), 1)
+
+        for i, q in enumerate(query_embeddings):
+            if mask is not None and mask[i].sum() <= expected_scan:
+                cand = np.flatnonzero(mask[i])
+            else:
+                cand = np.sort(self.candidates(q, n_probe))
+                if mask is not None:
+                    cand = cand[mask[i, cand]]
+            if len(cand) == 0:
+                continue
+            scores = cosine_scores(q, self.embeddings[cand])
+            values, local = top_k(scores, k)
+            out_scores[i, :values.shape[1]] = values[0]
+            out_indices[i, :local.shape[1]] = cand[local[0]]
+
+        return out_scores, out_indices
+
+    def update(self, embeddings, previous_rows):
+        """
+        Index for a refreshed store without retraining k-means. `previous_rows[i]` is the
+        old row position of new row i, or -1 for added / changed rows; kept rows stay in
+        their bucket, new rows go to their nearest centroid and deleted rows drop out.
+        """
+        previous_rows = np.asarray(previous_rows, dtype=np.int64)
+        fresh = np.flatnonzero(previous_rows < 0)
+        if len(previous_rows) == 0 or len(fresh) > IVF_RETRAIN_FRACTION * len(previous_rows):
+            return IVFFlatIndex.build(embeddings, n_lists=len(self.centroids), n_probe=self.n_probe)
+
+        n_lists = len(self.centroids)
+        old_assign = np.empty(self.list_offsets[-1], dtype=np.int64)
+        old_assign[self.list_ids] = np.repeat(np.arange(n_lists), np.diff(self.list_offsets))
+
+        assign = np.empty(len(previous_rows), dtype=np.int64)
+        kept = previous_rows >= 0
+        assign[kept] = old_assign[previous_rows[kept]]
+        for start in range(0, len(fresh), SCORE_CHUNK_ROWS):
+            rows = fresh[start:start + SCORE_CHUNK_ROWS]
+            assign[rows] = cosine_scores(embeddings[rows], self.centroids).argmax(axis=1)
+
+        list_ids = np.argsort(assign, kind="stable").astype(np.int64)
+        list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=n_lists))]).astype(np.int64)
+        return IVFFlatIndex(embeddings, self.centroids, list_offsets, list_ids, n_probe=self.n_probe)
+
+    def save(self, path):
+        np.savez(
+            path,
+            kind=np.array(self.kind),
+            centroids=self.centroids,
+            list_offsets=self.list_offsets,
+            list_ids=self.list_ids
+        )
+
+    @classmethod
+    def load(cls, path, embeddings, n_probe=IVF_N_PROBE):
+        data = np.load(path)
+        return cls(embeddings, data["centroids"], data["list_offsets"], data["list_ids"], n_probe=n_probe)
+
+
+INDEX_BACKENDS = {
+    ExactIndex.kind: ExactIndex,
+    IVFFlatIndex.kind: IVFFlatIndex,
+}
+
+
+def build_index(embeddings, kind=INDEX_TYPE, **params):
+    if kind not in INDEX_BACKENDS:
+        raise ValueError(f"Unknown index type: {kind} (expected one of {list(INDEX_BACKENDS)})")
+    if kind == ExactIndex.kind:
+        return ExactIndex(embeddings)
+    return INDEX_BACKENDS[kind].build(embeddings, **params)
+
+
+def index_config(kind=INDEX_TYPE, **params) -> dict:
+    """
+    Build settings for `kind`: explicit params over the environment defaults (n_lists=0
+    stays "auto", so a growing catalog does not count as a change). A persisted index
+    is only reused while its stored config matches.
+    """
+    params = {key: value for key, value in params.items() if key != "n_probe"}  # query-time only
+    if kind == IVFFlatIndex.kind:
+        return {"n_lists": IVF_N_LISTS, **params}
+    return params
+
+
+def load_index(path, embeddings, kind):
+    if kind not in INDEX_BACKENDS:
+        raise ValueError(f"Unknown index type: {kind} (expected one of {list(INDEX_BACKENDS)})")
+    return INDEX_BACKENDS[kind].load(path, embeddings)
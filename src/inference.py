@@ -0,0 +1,131 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from src.metrics import Histogram, LATENCY_BUCKETS_MS
+except ImportError:
+    from metrics import Histogram, LATENCY_BUCKETS_MS
+
+# Threads running encode / search / rerank, and how many more calls may wait for one
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "1"))
+INFERENCE_MAX_QUEUE = int(os.getenv("INFERENCE_MAX_QUEUE", "64"))
+
+
+def default_torch_threads(workers=INFERENCE_WORKERS) -> int:
+    # Split the cores between server processes and inference threads instead of letting each oversubscribe them
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    processes = int(os.getenv("WEB_CONCURRENCY", "1"))
+    return max(1, cpus // max(1, processes * workers))
+
+
+# Torch intra-op threads per process (0 = derive from the core count)
+INFERENCE_TORCH_THREADS = int(os.getenv("INFERENCE_TORCH_THREADS", "0")) or default_torch_threads()
+
+
+class QueueFullError(RuntimeError):
+    """Raised instead of queueing when no inference slot is free"""
+
+
+def configure_torch_threads(num_threads: int):
+    import torch
+
+    torch.set_num_threads(num_threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Only settable before the first inter-op parallel call in the process
+        pass
+
+
+class InferencePool:
+    """
+    Fixed set of threads for CPU-bound model calls with a bounded backlog.
+    At most `max_workers + max_queue` calls are admitted at a time; `submit`
+    raises QueueFullError beyond that (or waits for a slot with block=True).
+    """
+
+    def __init__(self, max_workers=INFERENCE_WORKERS, max_queue=INFERENCE_MAX_QUEUE, torch_threads=INFERENCE_TORCH_THREADS, name="inference"):
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.torch_threads = torch_threads
+        self.name = name
+
+        self.queue_wait_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.run_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.completed = 0
+        self.rejected = 0
+        self.pending = 0
+
+        self._slots = threading.Semaphore(self.max_workers + self.max_queue)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        # Threads (and torch settings) are created in the serving process, never before a fork
+        with self._lock:
+            if self._executor is None:
+                configure_torch_threads(self.torch_threads)
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    @property
+    def running(self) -> bool:
+        return self._executor is not None
+
+    def full(self) -> bool:
+        return self.pending >= self.max_workers + self.max_queue
+
+    def submit(self, fn, *args, block=False):
+        if not self._slots.acquire(blocking=block):
+            with self._lock:
+                self.rejected += 1
+            raise QueueFullError(f"Inference queue full ({self.pending} calls pending).")
+
+        self.start()
+        with self._lock:
+            self.pending += 1
+        enqueued = time.perf_counter()
+
+        def run():
+            started = time.perf_counter()
+            self.queue_wait_ms.observe((started - enqueued) * 1000)
+            try:
+                return fn(*args)
+            finally:
+                self.run_ms.observe((time.perf_counter() - started) * 1000)
+
+        try:
+            future = self._executor.submit(run)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release(completed=True))
+        return future
+
+    def _release(self, completed=False):
+        with self._lock:
+            self.pending -= 1
+            self.completed += int(completed)
+        self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "torch_threads": self.torch_threads,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "queue_wait_ms": self.queue_wait_ms.snapshot(),
+            "run_ms": self.run_ms.snapshot()
+        }
@@ -1,9 +1,16 @@
-from playwright.sync_api import sync_playwright
+from playwright.async_api import async_playwright
 import pandas as pd
 import os
-from urllib.parse import urljoin
-
-CATALOG_URL = "https://www.shl.com/products/product-catalog/"
+import json
+import asyncio
+import argparse
+import hashlib
+from email.utils import formatdate
+from urllib.parse import urljoin, urlparse, urlencode, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# SHL_CATALOG_URL points the crawler at a local fixture server (see serve_fixtures) for tests
+CATALOG_URL = os.getenv("SHL_CATALOG_URL", "https://www.shl.com/products/product-catalog/")
 OUTPUT_PATH = "data/raw/shl_catalog_raw.csv"
 FILTERED_OUTPUT_PATH = "data/raw/shl_catalog_filtered_out.csv"
 
@@ -11,6 +18,13 @@ DEBUG_HTML = "data/raw/debug_page.html"
 DEBUG_PNG = "data/raw/debug_page.png"
 PROFILE_DIR = "data/playwright_profile"
 
+# One JSON line per finished listing page; an interrupted crawl resumes from here
+CHECKPOINT_PATH = "data/raw/crawl_checkpoint.jsonl"
+
+# Listing pages fetched in parallel (one browser page each)
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "4"))
+CRAWL_HEADLESS = os.getenv("CRAWL_HEADLESS", "0") == "1"
+
 KEY_MAP = {
     "A": "Ability & Aptitude",
     "B": "Biodata & Situational Judgement",
@@ -22,36 +36,143 @@ KEY_MAP = {
     "S": "Simulations",
 }
 
+# type=1: Individual Test Solutions (assessments), type=2: Pre-packaged Job Solutions (filtered out)
+CATALOG_TYPES = {
+    1: {"row_selector": "tr[data-entity-id]", "id_attr": "data-entity-id", "kind_label": "type_1_individual"},
+    2: {"row_selector": "tr[data-course-id]", "id_attr": "data-course-id", "kind_label": "type_2_job_solution"},
+}
+
+# Whole listing table + pagination links in one round-trip instead of a locator call per cell
+EXTRACT_PAGE_JS = """
+({rowSelector, idAttr}) => {
+    const yes = td => td.querySelector("span.catalogue__circle.-yes") ? "Yes" : "No";
+    const rows = [];
+    for (const tr of document.querySelectorAll(rowSelector)) {
+        const tds = tr.querySelectorAll("td");
+        if (tds.length < 4) continue;
+        const a = tds[0].querySelector("a");
+        rows.push({
+            id: tr.getAttribute(idAttr) || "",
+            name: a ? (a.innerText || a.textContent || "").trim() : "",
+            href: a ? (a.getAttribute("href") || "") : "",
+            remote: yes(tds[1]),
+            adaptive: yes(tds[2]),
+            keys: Array.from(tds[3].querySelectorAll("span.product-catalogue__key"))
+                .map(s => (s.innerText || s.textContent || "").trim())
+                .filter(Boolean)
+        });
+    }
+    const pages = Array.from(document.querySelectorAll("li.pagination__item a")).map(a => a.getAttribute("href") || "");
+    const next = Array.from(document.querySelectorAll("li.pagination__item.-arrow.-next a.pagination__arrow"))
+        .map(a => a.getAttribute("href") || "");
+    return {rows, pages, next};
+}
+"""
+
 
 def ensure_dirs():
     os.makedirs("data/raw", exist_ok=True)
     os.makedirs(PROFILE_DIR, exist_ok=True)
 
 
-def dump_debug(page, note: str):
+def site_root(catalog_url=CATALOG_URL) -> str:
+    parsed = urlparse(catalog_url)
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+
+def page_url(type_id: int, start: int = 0, catalog_url=CATALOG_URL) -> str:
+    params = {"start": start, "type": type_id} if start else {"type": type_id}
+    return f"{catalog_url.split('?')[0]}?{urlencode(params)}"
+
+
+def _query_int(href: str, name: str):
+    values = parse_qs(urlparse(href).query).get(name)
+    try:
+        return int(values[0]) if values else None
+    except ValueError:
+        return None
+
+
+def page_starts(hrefs, type_id: int) -> list:
+    """
+    Every listing offset for `type_id`, inferred from the pagination links on its first page
+    """
+    starts = sorted({
+        _query_int(h, "start") or 0
+        for h in hrefs
+        if _query_int(h, "type") == type_id
+    } | {0})
+    if len(starts) < 2:
+        return starts
+    step = min(b - a for a, b in zip(starts, starts[1:]))
+    return list(range(0, starts[-1] + 1, step))
+
+
+def to_records(rows, kind_label: str, root=None) -> list:
+    root = root or site_root()
+    records = []
+    for row in rows:
+        if not row["name"] and not row["href"]:
+            continue
+        keys = row["keys"]
+        records.append(
+            {
+                "id": row["id"],
+                "catalog_type": kind_label,  # type_1_individual / type_2_job_solution
+                "assessment_name": row["name"],
+                "url": urljoin(root, row["href"]),
+                "remote_testing_support": row["remote"],
+                "adaptive_irt": row["adaptive"],
+                "test_type_keys": ", ".join(keys),
+                "test_type": ", ".join(KEY_MAP.get(k, k) for k in keys),
+            }
+        )
+    return records
+
+
+# ---------------- Checkpoint ----------------
+def load_checkpoint(path=CHECKPOINT_PATH) -> dict:
+    """
+    {(type_id, start): page result} for every listing page already crawled
+    """
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # torn last line from an interrupted write
+            done[(entry["type"], entry["start"])] = entry
+    return done
+
+
+def append_checkpoint(entry: dict, path=CHECKPOINT_PATH):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        f.flush()
+
+
+# ---------------- Browser ----------------
+async def dump_debug(page, note: str):
     ensure_dirs()
     try:
-        page.screenshot(path=DEBUG_PNG, full_page=True)
+        await page.screenshot(path=DEBUG_PNG, full_page=True)
     except Exception:
         pass
     try:
         with open(DEBUG_HTML, "w", encoding="utf-8") as f:
-            f.write(page.content())
+            f.write(await page.content())
     except Exception:
         pass
 
-    try:
-        title = page.title()
-    except Exception:
-        title = "N/A"
-
     print(f"[DEBUG] {note}")
     print(f"[DEBUG] url={page.url}")
-    print(f"[DEBUG] title={title}")
     print(f"[DEBUG] saved {DEBUG_PNG} and {DEBUG_HTML}")
 
 
-def try_accept_cookies(page) -> bool:
+async def try_accept_cookies(page) -> bool:
     for sel in (
         "button:has-text('Accept all')",
         "button:has-text('Accept All')",
@@ -63,164 +184,229 @@ def try_accept_cookies(page) -> bool:
     ):
         try:
             btn = page.locator(sel).first
-            if btn.count() > 0:
-                btn.click(timeout=2000)
-                page.wait_for_timeout(500)
+            if await btn.count() > 0:
+                await btn.click(timeout=2000)
                 return True
         except Exception:
             pass
     return False
 
 
-def pick_best_frame(page):
-    best = page.main_frame
-    best_count = -1
-    for fr in page.frames:
+async def extract_page(page, type_id: int):
+    """
+    Evaluate EXTRACT_PAGE_JS in the main frame, falling back to the first frame that has rows
+    """
+    spec = CATALOG_TYPES[type_id]
+    args = {"rowSelector": spec["row_selector"], "idAttr": spec["id_attr"]}
+    result = await page.main_frame.evaluate(EXTRACT_PAGE_JS, args)
+    if result["rows"]:
+        return result
+    for frame in page.frames:
+        if frame is page.main_frame:
+            continue
         try:
-            c = fr.locator("a").count()
+            framed = await frame.evaluate(EXTRACT_PAGE_JS, args)
         except Exception:
-            c = 0
-        if c > best_count:
-            best = fr
-            best_count = c
-    return best, best_count
-
+            continue
+        if framed["rows"]:
+            return framed
+    return result
 
-def yes_no(td) -> str:
-    return "Yes" if td.locator("span.catalogue__circle.-yes").count() > 0 else "No"
 
+async def crawl_page(page, type_id: int, start: int, fixtures_dir=None) -> dict:
+    url = page_url(type_id, start)
+    resp = await page.goto(url, wait_until="domcontentloaded", timeout=60000)
+    print(f"[DEBUG] goto_status={resp.status if resp else None} type={type_id} start={start}")
 
-def scrape_one_type(page, type_id: int, row_selector: str, id_attr: str, kind_label: str):
-    records = []
-    current_url = f"{CATALOG_URL}?type={type_id}"
-    seen_urls = set()
-
-    while current_url and current_url not in seen_urls:
-        seen_urls.add(current_url)
-
-        resp = page.goto(current_url, wait_until="domcontentloaded", timeout=60000)
-        status = resp.status if resp else None
-        print(f"[DEBUG] goto_status={status} type={type_id} url={current_url}")
-
-        try:
-            page.wait_for_selector("div.product-catalogue__list", timeout=30000)
-        except Exception:
-            dump_debug(page, "product-catalogue__list not found (page structure changed?)")
-            break
-
-        try_accept_cookies(page)
-
-        # Prefer main page; fallback to the frame with most anchors if needed
-        root = page
-        if root.locator(row_selector).count() == 0:
-            fr, _ = pick_best_frame(page)
-            if fr.locator(row_selector).count() > 0:
-                root = fr
-
-        rows = root.locator(row_selector)
-        row_count = rows.count()
-        print(f"[DEBUG] type={type_id} rows_on_page={row_count}")
-
-        for i in range(row_count):
-            row = rows.nth(i)
-            rid = row.get_attribute(id_attr) or ""
-
-            tds = row.locator("td")
-            if tds.count() < 4:
-                continue
-
-            a = tds.nth(0).locator("a").first
-            try:
-                name = (a.inner_text(timeout=2000) or "").strip()
-            except Exception:
-                name = ""
-
-            href = a.get_attribute("href") or ""
-            full_url = urljoin("https://www.shl.com", href)
-
-            remote = yes_no(tds.nth(1))
-            adaptive = yes_no(tds.nth(2))
-
-            keys_loc = tds.nth(3).locator("span.product-catalogue__key")
-            keys = []
-            for k in range(keys_loc.count()):
-                keys.append((keys_loc.nth(k).inner_text() or "").strip())
-
-            key_names = [KEY_MAP.get(k, k) for k in keys if k]
-
-            if not name and not href:
-                continue
-
-            records.append(
-                {
-                    "id": rid,
-                    "catalog_type": kind_label,  # type_1_individual / type_2_job_solution
-                    "assessment_name": name,
-                    "url": full_url,
-                    "remote_testing_support": remote,
-                    "adaptive_irt": adaptive,
-                    "test_type_keys": ", ".join([k for k in keys if k]),
-                    "test_type": ", ".join(key_names),
-                }
-            )
-
-        # Next page (for THIS type)
-        next_link = root.locator(
-            f"li.pagination__item.-arrow.-next a.pagination__arrow[href*='type={type_id}']"
-        ).first
-        if next_link.count() == 0:
-            current_url = None
-        else:
-            current_url = urljoin("https://www.shl.com", next_link.get_attribute("href"))
-
-    return records
-
-
-def scrape_shl_catalog():
+    try:
+        await page.wait_for_selector("div.product-catalogue__list", timeout=30000)
+    except Exception:
+        await dump_debug(page, "product-catalogue__list not found (page structure changed?)")
+        raise
+
+    await try_accept_cookies(page)
+    result = await extract_page(page, type_id)
+
+    if fixtures_dir:
+        # Saved pages replay through serve_fixtures
+        os.makedirs(fixtures_dir, exist_ok=True)
+        with open(os.path.join(fixtures_dir, f"catalog_type{type_id}_start{start}.html"), "w", encoding="utf-8") as f:
+            f.write(await page.content())
+
+    return {
+        "type": type_id,
+        "start": start,
+        "records": to_records(result["rows"], CATALOG_TYPES[type_id]["kind_label"]),
+        "pages": [h for h in result["pages"] if _query_int(h, "type") == type_id],
+        "next": [h for h in result["next"] if _query_int(h, "type") == type_id],
+    }
+
+
+async def crawl_catalog(concurrency=CRAWL_CONCURRENCY, checkpoint_path=CHECKPOINT_PATH, headless=CRAWL_HEADLESS, fixtures_dir=None):
+    """
+    Crawl every listing page of both catalog types with a pool of `concurrency` pages.
+    First pages are fetched first to discover the pagination; the remaining pages of
+    both types then share one work queue. Finished pages are checkpointed as they land.
+    """
     ensure_dirs()
+    done = load_checkpoint(checkpoint_path)
+    if done:
+        print(f"🔁 Resuming crawl: {len(done)} listing pages already in {checkpoint_path}")
 
-    with sync_playwright() as p:
-        context = p.chromium.launch_persistent_context(
+    async with async_playwright() as p:
+        context = await p.chromium.launch_persistent_context(
             user_data_dir=PROFILE_DIR,
-            headless=False,
+            headless=headless,
             viewport={"width": 1366, "height": 768},
             locale="en-US",
             args=["--disable-blink-features=AutomationControlled"],
         )
-        page = context.new_page()
-        page.add_init_script("Object.defineProperty(navigator,'webdriver',{get:()=>undefined});")
-
-        # type=1: Individual Test Solutions (assessments)
-        assessments = scrape_one_type(
-            page,
-            type_id=1,
-            row_selector="tr[data-entity-id]",
-            id_attr="data-entity-id",
-            kind_label="type_1_individual",
-        )
+        await context.add_init_script("Object.defineProperty(navigator,'webdriver',{get:()=>undefined});")
 
-        # type=2: Pre-packaged Job Solutions (we will “filter out”)
-        job_solutions = scrape_one_type(
-            page,
-            type_id=2,
-            row_selector="tr[data-course-id]",
-            id_attr="data-course-id",
-            kind_label="type_2_job_solution",
-        )
+        queue = asyncio.Queue()
+        queued = set()
+
+        def enqueue(type_id, start):
+            if (type_id, start) not in queued:
+                queued.add((type_id, start))
+                queue.put_nowait((type_id, start))
 
-        df_assessments = pd.DataFrame(assessments).drop_duplicates(subset=["url"])
-        df_filtered = pd.DataFrame(job_solutions).drop_duplicates(subset=["url"])
+        def expand(entry):
+            # Listing offsets from the first page's pagination, or the next link when there is none
+            starts = page_starts(entry["pages"], entry["type"]) if entry["start"] == 0 else []
+            for start in starts[1:]:
+                enqueue(entry["type"], start)
+            for href in entry["next"]:
+                enqueue(entry["type"], _query_int(href, "start") or 0)
 
-        df_assessments.to_csv(OUTPUT_PATH, index=False)
-        print(f"Found {len(df_assessments) + len(df_filtered)} product cards")
-        print(f"Saved {len(df_assessments)} assessments to {OUTPUT_PATH}")
+        for type_id in CATALOG_TYPES:
+            enqueue(type_id, 0)
 
-        if len(df_filtered) > 0:
-            df_filtered.to_csv(FILTERED_OUTPUT_PATH, index=False)
-            print(f"Saved {len(df_filtered)} filtered-out items to {FILTERED_OUTPUT_PATH}")
+        async def worker():
+            page = await context.new_page()
+            try:
+                while True:
+                    type_id, start = await queue.get()
+                    try:
+                        entry = done.get((type_id, start))
+                        if entry is None:
+                            try:
+                                entry = await crawl_page(page, type_id, start, fixtures_dir=fixtures_dir)
+                            except Exception as e:
+                                print(f"⚠️ type={type_id} start={start} failed: {e}")
+                                continue
+                            done[(type_id, start)] = entry
+                            append_checkpoint(entry, checkpoint_path)
+                        expand(entry)
+                    finally:
+                        queue.task_done()
+            finally:
+                await page.close()
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(max(1, concurrency))]
+        await queue.join()
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        await context.close()
+
+    missing = queued - set(done)
+    return done, missing
+
+
+def scrape_shl_catalog(concurrency=CRAWL_CONCURRENCY, fresh=False, headless=CRAWL_HEADLESS, fixtures_dir=None):
+    ensure_dirs()
+    if fresh and os.path.exists(CHECKPOINT_PATH):
+        os.remove(CHECKPOINT_PATH)
+
+    done, missing = asyncio.run(crawl_catalog(concurrency, CHECKPOINT_PATH, headless, fixtures_dir))
+
+    by_type = {type_id: [] for type_id in CATALOG_TYPES}
+    for (type_id, start) in sorted(done):
+        by_type[type_id].extend(done[(type_id, start)]["records"])
+
+    df_assessments = pd.DataFrame(by_type[1]).drop_duplicates(subset=["url"])
+    df_filtered = pd.DataFrame(by_type[2]).drop_duplicates(subset=["url"])
+
+    df_assessments.to_csv(OUTPUT_PATH, index=False)
+    print(f"Found {len(df_assessments) + len(df_filtered)} product cards")
+    print(f"Saved {len(df_assessments)} assessments to {OUTPUT_PATH}")
+
+    if len(df_filtered) > 0:
+        df_filtered.to_csv(FILTERED_OUTPUT_PATH, index=False)
+        print(f"Saved {len(df_filtered)} filtered-out items to {FILTERED_OUTPUT_PATH}")
+
+    if missing:
+        # Keep the checkpoint so the next run only retries the failed pages
+        print(f"⚠️ {len(missing)} listing pages failed; re-run to resume: {sorted(missing)}")
+    elif os.path.exists(CHECKPOINT_PATH):
+        os.remove(CHECKPOINT_PATH)
+
+
+# ---------------- Fixtures ----------------
+def serve_fixtures(directory, host="127.0.0.1", port=8766):
+    """
+    Serve saved pages for offline crawls: listing URLs (?type=T&start=S) map to
+    catalog_typeT_startS.html, any other path (e.g. detail pages) to <path>.html under `directory`.
+    Crawl with SHL_CATALOG_URL=http://host:port/products/product-catalog/ and enrich with
+    ENRICH_BASE_URL=http://host:port
+    """
+
+    class FixtureHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            parsed = urlparse(self.path)
+            type_id = _query_int(self.path, "type")
+            if type_id is not None:
+                name = f"catalog_type{type_id}_start{_query_int(self.path, 'start') or 0}.html"
+            else:
+                name = parsed.path.strip("/") + ".html"
+            path = os.path.normpath(os.path.join(directory, name))
+
+            if not path.startswith(os.path.abspath(directory)) or not os.path.isfile(path):
+                self.send_response(404)
+                self.end_headers()
+                return
+
+            with open(path, "rb") as f:
+                body = f.read()
+
+            # Validators so conditional requests (src/enrichment.py) can be exercised offline
+            etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            last_modified = formatdate(os.path.getmtime(path), usegmt=True)
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", last_modified)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
 
-        context.close()
+    directory = os.path.abspath(directory)
+    server = ThreadingHTTPServer((host, port), FixtureHandler)
+    print(f"🧪 Serving fixtures from {directory} on http://{host}:{port}")
+    server.serve_forever()
 
 
 if __name__ == "__main__":
-    scrape_shl_catalog()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Crawl the SHL product catalogue")
+    parser.add_argument("--concurrency", type=int, default=CRAWL_CONCURRENCY)
+    parser.add_argument("--fresh", action="store_true", help="ignore the checkpoint and crawl from scratch")
+    parser.add_argument("--headless", action="store_true", default=CRAWL_HEADLESS)
+    parser.add_argument("--save-fixtures", metavar="DIR", help="also save every listing page as a fixture")
+    parser.add_argument("--serve-fixtures", metavar="DIR", help="serve saved fixtures instead of crawling")
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    if args.serve_fixtures:
+        serve_fixtures(args.serve_fixtures, port=args.port)
+    else:
+        scrape_shl_catalog(args.concurrency, fresh=args.fresh, headless=args.headless, fixtures_dir=args.save_fixtures)
@@ -0,0 +1,223 @@
+import os
+import re
+import numpy as np
+
+try:
+    from src.catalog import catalog_hash
+    from src.index import top_k, cosine_scores
+except ImportError:
+    from catalog import catalog_hash
+    from index import top_k, cosine_scores
+
+BM25_PATH = "data/processed/shl_bm25.npz"
+
+# Retrieval mode for the recommend path: "dense" (embeddings only) or "hybrid" (BM25 + dense, RRF-fused).
+# Dense stays the default until `python src/evaluate.py --mode hybrid` shows hybrid is no worse
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "dense")
+# BM25 short list per query; dense scoring runs only on it when it holds at least k eligible rows
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "100"))
+RRF_K = 60
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Keeps tokens such as "c++", "c#", "4.5" and ".net" -> "net" intact
+_TOKEN = re.compile(r"[a-z0-9][a-z0-9+#.]*")
+
+
+def tokenize(text: str) -> list:
+    return [t.rstrip(".") for t in _TOKEN.findall(str(text).lower()) if t.rstrip(".")]
+
+
+class BM25Index:
+    """
+    In-memory inverted index with precomputed BM25 weights per posting,
+    so scoring a query is one scatter-add per query term.
+    """
+
+    def __init__(self, terms, offsets, doc_ids, weights, idf, n_docs, content_hash=""):
+        self.terms = {term: i for i, term in enumerate(terms)}
+        self.term_list = list(terms)
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.idf = idf
+        self.n_docs = n_docs
+        self.content_hash = content_hash
+
+    def __len__(self):
+        return self.n_docs
+
+    @classmethod
+    def build(cls, texts, k1=BM25_K1, b=BM25_B):
+        texts = [str(t) for t in texts]
+        docs = [tokenize(t) for t in texts]
+        n_docs = len(docs)
+        doc_len = np.array([len(d) for d in docs], dtype=np.float32)
+        avg_len = float(doc_len.mean()) if n_docs and doc_len.mean() > 0 else 1.0
+
+        postings = {}
+        for doc_id, tokens in enumerate(docs):
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                postings.setdefault(token, []).append((doc_id, tf))
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        doc_ids, tfs, idf = [], [], np.zeros(len(terms), dtype=np.float32)
+        for i, term in enumerate(terms):
+            plist = postings[term]
+            offsets[i + 1] = offsets[i] + len(plist)
+            df = len(plist)
+            idf[i] = np.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for doc_id, tf in plist:
+                doc_ids.append(doc_id)
+                tfs.append(tf)
+
+        doc_ids = np.array(doc_ids, dtype=np.int64)
+        tfs = np.array(tfs, dtype=np.float32)
+        term_of_posting = np.repeat(np.arange(len(terms)), np.diff(offsets))
+        norm = k1 * (1 - b + b * doc_len[doc_ids] / avg_len) if len(doc_ids) else np.zeros(0, dtype=np.float32)
+        weights = (idf[term_of_posting] * tfs * (k1 + 1) / (tfs + norm)).astype(np.float32)
+
+        return cls(terms, offsets, doc_ids, weights, idf, n_docs, catalog_hash(texts))
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        for token in set(tokenize(query)):
+            i = self.terms.get(token)
+            if i is None:
+                continue
+            start, end = self.offsets[i], self.offsets[i + 1]
+            np.add.at(scores, self.doc_ids[start:end], self.weights[start:end])
+        return scores
+
+    def search(self, query: str, k=10, mask=None):
+        """
+        Returns (indices, scores) of up to k documents with a positive BM25 score, best first
+        """
+        scores = self.scores(query)
+        if mask is not None:
+            scores[~mask] = 0.0
+        values, indices = top_k(scores, k)
+        found = values[0] > 0
+        return indices[0][found], values[0][found]
+
+    def save(self, path=BM25_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                terms=np.array(self.term_list, dtype=str),
+                offsets=self.offsets,
+                doc_ids=self.doc_ids,
+                weights=self.weights,
+                idf=self.idf,
+                n_docs=np.array(self.n_docs),
+                content_hash=np.array(self.content_hash)
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=BM25_PATH):
+        data = np.load(path)
+        return cls(
+            data["terms"].tolist(),
+            data["offsets"],
+            data["doc_ids"],
+            data["weights"],
+            data["idf"],
+            int(data["n_docs"]),
+            str(data["content_hash"])
+        )
+
+
+def build_lexical_index(texts, path=BM25_PATH):
+    index = BM25Index.build(texts)
+    index.save(path)
+    return index
+
+
+def load_lexical_index(texts, path=BM25_PATH):
+    """
+    Load the persisted BM25 index, rebuilding it when it was built for other catalog texts
+    """
+    texts = [str(t) for t in texts]
+    if os.path.exists(path):
+        try:
+            index = BM25Index.load(path)
+            if index.content_hash == catalog_hash(texts):
+                return index
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ Could not load BM25 index {path}: {e}")
+
+    print("🔹 BM25 index missing or stale, rebuilding...")
+    index = BM25Index.build(texts)
+    try:
+        index.save(path)
+    except OSError as e:
+        print(f"⚠️ Could not save BM25 index {path}: {e}")
+    return index
+
+
+def _rrf(rankings, k, rrf_k):
+    fused = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            if doc >= 0:
+                fused[doc] = fused.get(doc, 0.0) + 1.0 / (rrf_k + rank + 1)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+def hybrid_search(query_texts, query_embeddings, dense_index, lexical_index, k=10, mask=None, candidates=HYBRID_CANDIDATES, rrf_k=RRF_K):
+    """
+    BM25 picks a short list of up to `candidates` rows per query and only those rows
+    are scored densely; the two rankings are fused with reciprocal rank fusion.
+    Queries whose short list has fewer than k eligible rows fall back to a full
+    (or ANN) dense search under the caller's mask, fused with whatever BM25 found,
+    so hybrid never returns fewer rows than dense. Returns (scores, indices) like index.search.
+    """
+    n_queries = len(query_texts)
+    query_embeddings = np.asarray(query_embeddings, dtype=np.float32)
+    if mask is not None:
+        mask = np.asarray(mask, dtype=bool)
+        if mask.ndim == 1:
+            mask = np.broadcast_to(mask, (n_queries, len(mask)))
+
+    out_scores = np.full((n_queries, k), -np.inf, dtype=np.float32)
+    out_indices = np.full((n_queries, k), -1, dtype=np.int64)
+
+    lexical_hits = [
+        lexical_index.search(text, max(k, candidates), mask=None if mask is None else mask[i])
+        for i, text in enumerate(query_texts)
+    ]
+
+    # Short lists too small to fill k rows: one batched dense search for those queries
+    fallback = [i for i, (lex_ids, _) in enumerate(lexical_hits) if len(lex_ids) < k]
+    dense_rankings = {}
+    if fallback:
+        _, dense_ids = dense_index.search(
+            query_embeddings[fallback],
+            k=max(k, candidates),
+            mask=None if mask is None else mask[fallback]
+        )
+        dense_rankings = dict(zip(fallback, dense_ids.tolist()))
+
+    for i, (lex_ids, _) in enumerate(lexical_hits):
+        lex_ids = lex_ids.tolist()
+        if i in dense_rankings:
+            dense_ranking = dense_rankings[i]
+        else:
+            # Dense scores for the short-listed rows only: a gather, not a corpus scan
+            rows = np.sort(lex_ids)
+            scores = cosine_scores(query_embeddings[i], dense_index.embeddings[rows])[0]
+            dense_ranking = rows[np.argsort(-scores, kind="stable")].tolist()
+
+        for j, (doc, score) in enumerate(_rrf([dense_ranking, lex_ids], k, rrf_k)):
+            out_indices[i, j] = doc
+            out_scores[i, j] = score
+
+    return out_scores, out_indices
@@ -0,0 +1,285 @@
+import os
+import json
+import time
+import asyncio
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    from src.cache import normalize_query
+except ImportError:
+    from cache import normalize_query
+
+GEMINI_MODEL_NAME = "gemini-2.5-flash"
+
+# Bounded concurrency + per-call timeout for query rewriting
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "10"))
+
+# Circuit breaker: trip after N consecutive failed/slow calls, retry one probe after the cool-down
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_SLOW_MS = float(os.getenv("LLM_BREAKER_SLOW_MS", "2000"))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+
+# Point at a local stub server (python src/llm.py --port 8765) instead of Gemini
+LLM_STUB_URL = os.getenv("LLM_STUB_URL")
+
+
+def build_rewrite_prompt(user_query: str) -> str:
+    return f"""
+Extract key hiring intent from the query below.
+Return a concise sentence with skills, role, constraints.
+
+Query:
+{user_query}
+"""
+
+
+def rewrite_cache_key(user_query: str) -> str:
+    return f"{GEMINI_MODEL_NAME}:{normalize_query(user_query)}"
+
+
+class LLMTimeoutError(Exception):
+    pass
+
+
+class LLMUnavailableError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after `failure_threshold` consecutive failures (errors, timeouts
+    or calls slower than `slow_call_ms`). While open every call is short-circuited;
+    after `reset_seconds` a single half-open probe decides whether to close again.
+    Meant to be used from one event loop, so no locking.
+    """
+
+    def __init__(self, failure_threshold=LLM_BREAKER_FAILURES, slow_call_ms=LLM_BREAKER_SLOW_MS, reset_seconds=LLM_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.slow_call_ms = slow_call_ms
+        self.reset_seconds = reset_seconds
+
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+        self.trips = 0
+        self.short_circuits = 0
+
+    def allow(self) -> bool:
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self.state = "half_open"
+
+        if self.state == "half_open":
+            if self._probe_in_flight:
+                self.short_circuits += 1
+                return False
+            self._probe_in_flight = True
+            return True
+
+        if self.state == "open":
+            self.short_circuits += 1
+            return False
+        return True
+
+    def record(self, ok: bool, latency_ms: float):
+        self._probe_in_flight = False
+        if ok and latency_ms <= self.slow_call_ms:
+            self.consecutive_failures = 0
+            self.state = "closed"
+            return
+
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self.trips += 1
+
+    def release(self):
+        """Call abandoned (e.g. cancelled) - neither success nor failure"""
+        self._probe_in_flight = False
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "trips": self.trips,
+            "short_circuits": self.short_circuits
+        }
+
+
+class GeminiBackend:
+    """
+    Non-blocking Gemini call via the SDK's async API
+    """
+
+    def __init__(self, gemini_model):
+        self.gemini_model = gemini_model
+
+    async def generate(self, prompt: str) -> str:
+        response = await self.gemini_model.generate_content_async(prompt)
+        return response.text
+
+
+class HTTPStubBackend:
+    """
+    Talks to a local stub LLM server: POST {"prompt": ...} -> {"text": ...}
+    """
+
+    def __init__(self, url: str):
+        import httpx
+
+        self.url = url
+        self.client = httpx.AsyncClient()
+
+    async def generate(self, prompt: str) -> str:
+        response = await self.client.post(self.url, json={"prompt": prompt})
+        response.raise_for_status()
+        return response.json()["text"]
+
+
+class AsyncLLMClient:
+    """
+    Async query rewriter: cache lookup, then at most `max_concurrency` in-flight
+    LLM calls, each bounded by `timeout` seconds. Cancelling the awaiting task
+    (e.g. on client disconnect) cancels the underlying call. With a `breaker`,
+    calls are skipped (LLMUnavailableError) while the LLM is failing or slow.
+    """
+
+    def __init__(self, backend, prompt_fn, cache=None, key_fn=None, max_concurrency=LLM_MAX_CONCURRENCY, timeout=LLM_TIMEOUT_SECONDS, breaker=None):
+        self.backend = backend
+        self.breaker = breaker
+        self.prompt_fn = prompt_fn
+        self.cache = cache
+        self.key_fn = key_fn or (lambda q: q)
+        self.timeout = timeout
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.max_concurrency = max_concurrency
+
+        self._pending_writes = set()
+
+        self.calls = 0
+        self.in_flight = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    async def rewrite(self, query: str) -> str:
+        key = self.key_fn(query)
+        if self.cache is not None:
+            # Memory hits are served inline; the SQLite tier runs on a thread so the loop never blocks on disk
+            cached = self.cache.get_memory(key)
+            if cached is None:
+                if self.cache.persistent:
+                    cached = await asyncio.to_thread(self.cache.get_persistent, key)
+                else:
+                    cached = self.cache.get_persistent(key)
+            if cached is not None:
+                return cached
+
+        if self.breaker is not None and not self.breaker.allow():
+            raise LLMUnavailableError("LLM circuit breaker is open")
+
+        recorded = False
+        start = time.perf_counter()
+        try:
+            async with self.semaphore:
+                self.calls += 1
+                self.in_flight += 1
+                start = time.perf_counter()
+                try:
+                    text = await asyncio.wait_for(self.backend.generate(self.prompt_fn(query)), self.timeout)
+                except asyncio.TimeoutError:
+                    self.timeouts += 1
+                    self._record(False, start)
+                    recorded = True
+                    raise LLMTimeoutError(f"LLM rewrite exceeded {self.timeout}s")
+                except Exception:
+                    self.errors += 1
+                    self._record(False, start)
+                    recorded = True
+                    raise
+                finally:
+                    self.in_flight -= 1
+
+            self._record(True, start)
+            recorded = True
+        finally:
+            if not recorded and self.breaker is not None:
+                self.breaker.release()
+
+        refined = text.strip()
+        if self.cache is not None:
+            expires_at = self.cache.put_memory(key, refined)
+            if self.cache.persistent:
+                # Write-behind: the response does not wait for the commit
+                task = asyncio.ensure_future(asyncio.to_thread(self.cache.put_persistent, key, refined, expires_at))
+                self._pending_writes.add(task)
+                task.add_done_callback(self._write_done)
+        return refined
+
+    async def flush(self):
+        """
+        Wait for write-behind cache writes (e.g. before the event loop closes)
+        """
+        if self._pending_writes:
+            await asyncio.gather(*list(self._pending_writes), return_exceptions=True)
+
+    def _write_done(self, task):
+        self._pending_writes.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"⚠️ Could not persist LLM rewrite: {task.exception()}")
+
+    def _record(self, ok, start):
+        if self.breaker is not None:
+            self.breaker.record(ok, (time.perf_counter() - start) * 1000)
+
+    def stats(self) -> dict:
+        return {
+            "breaker": self.breaker.stats() if self.breaker is not None else None,
+            "calls": self.calls,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "timeout_seconds": self.timeout,
+            "timeouts": self.timeouts,
+            "errors": self.errors
+        }
+
+
+# ---------------- STUB SERVER ----------------
+def serve_stub(host="127.0.0.1", port=8765, delay_ms=0.0):
+    """
+    Minimal stand-in for the LLM: echoes the query line of the prompt after `delay_ms`
+    """
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            prompt = json.loads(self.rfile.read(length) or b"{}").get("prompt", "")
+            time.sleep(delay_ms / 1000.0)
+
+            lines = [line for line in prompt.strip().splitlines() if line.strip()]
+            body = json.dumps({"text": lines[-1] if lines else ""}).encode("utf-8")
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    print(f"🧪 Stub LLM listening on http://{host}:{port} (delay {delay_ms} ms)")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stub LLM server for load / integration testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay-ms", type=float, default=0.0)
+    args = parser.parse_args()
+    serve_stub(args.host, args.port, args.delay_ms)
@@ -0,0 +1,35 @@
+import os
+import resource
+
+SMAPS_ROLLUP = "/proc/self/smaps_rollup"
+
+
+def process_memory() -> dict:
+    """
+    Memory of this process in MB. On Linux, RSS is split into pages shared with other
+    processes (e.g. forked workers) and private ones; PSS charges shared pages pro rata,
+    so summing PSS over all workers gives the real footprint.
+    """
+    stats = {"pid": os.getpid()}
+    try:
+        with open(SMAPS_ROLLUP, "r") as f:
+            fields = {}
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1])
+    except OSError:
+        # Not Linux (or /proc unavailable): peak RSS only (bytes on macOS, kB elsewhere)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        stats["max_rss_mb"] = round(peak / (1024 * 1024 if os.uname().sysname == "Darwin" else 1024), 1)
+        return stats
+
+    shared = fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)
+    private = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    stats.update({
+        "rss_mb": round(fields.get("Rss", 0) / 1024, 1),
+        "pss_mb": round(fields.get("Pss", 0) / 1024, 1),
+        "shared_mb": round(shared / 1024, 1),
+        "private_mb": round(private / 1024, 1)
+    })
+    return stats
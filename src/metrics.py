@@ -0,0 +1,180 @@
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Default bucket upper bounds
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128]
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+
+class Histogram:
+    """
+    Thread-safe cumulative histogram (Prometheus-style `le` buckets)
+    """
+
+    def __init__(self, buckets):
+        self.buckets = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot = +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self._counts[i] += 1
+                    break
+            else:
+                self._counts[-1] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+
+        cumulative = []
+        running = 0
+        for bound, c in zip(self.buckets + ["+Inf"], counts):
+            running += c
+            cumulative.append({"le": bound, "count": running})
+
+        return {
+            "buckets": cumulative,
+            "count": count,
+            "sum": total,
+            "mean": total / count if count else 0.0
+        }
+
+
+class Counter:
+    """
+    Thread-safe monotonically increasing count, one value per label set
+    """
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def values(self) -> dict:
+        with self._lock:
+            return dict(self._values)
+
+
+def _label_text(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class MetricsRegistry:
+    """
+    Named counters and histograms rendered in the Prometheus text format.
+    Collectors are called at scrape time and return (name, type, help, value, labels)
+    tuples, so existing stats() counters are exported without double bookkeeping.
+    """
+
+    def __init__(self, prefix="shl_"):
+        self.prefix = prefix
+        self._families = {}  # name -> (type, help, Counter | {label key: Histogram})
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        with self._lock:
+            if name not in self._families:
+                self._families[name] = ("counter", help_text, Counter())
+            return self._families[name][2]
+
+    def histogram(self, name: str, help_text: str, buckets=LATENCY_BUCKETS_MS, histogram=None, **labels) -> Histogram:
+        """
+        The histogram for `labels` under `name`, created on first use (or registered, if given)
+        """
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            if name not in self._families:
+                self._families[name] = ("histogram", help_text, {})
+            children = self._families[name][2]
+            if histogram is not None:
+                children[key] = histogram
+            elif key not in children:
+                children[key] = Histogram(buckets)
+            return children[key]
+
+    def add_collector(self, fn):
+        self._collectors.append(fn)
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            families = list(self._families.items())
+
+        for name, (kind, help_text, metric) in families:
+            name = self.prefix + name
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            if kind == "counter":
+                for key, value in metric.values().items():
+                    lines.append(f"{name}{_label_text(key)} {value}")
+                continue
+            for key, histogram in list(metric.items()):
+                snap = histogram.snapshot()
+                for bucket in snap["buckets"]:
+                    lines.append(f"{name}_bucket{_label_text(key + (('le', bucket['le']),))} {bucket['count']}")
+                lines.append(f"{name}_sum{_label_text(key)} {snap['sum']}")
+                lines.append(f"{name}_count{_label_text(key)} {snap['count']}")
+
+        described = set()
+        for collect in self._collectors:
+            for name, kind, help_text, value, labels in collect():
+                name = self.prefix + name
+                if name not in described:
+                    described.add(name)
+                    lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+                lines.append(f"{name}{_label_text(tuple(sorted(labels.items())))} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+# ---------------- Stage timers ----------------
+registry = MetricsRegistry()
+
+# Per-request {stage: ms}, set by the API for each request (None outside one, e.g. on worker threads)
+request_timings = contextvars.ContextVar("request_timings", default=None)
+
+_stage_histograms = {}
+
+
+def record_stage(stage: str, ms: float):
+    histogram = _stage_histograms.get(stage)
+    if histogram is None:
+        histogram = _stage_histograms[stage] = registry.histogram("stage_duration_ms", "Time spent per pipeline stage", stage=stage)
+    histogram.observe(ms)
+
+    timings = request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + ms
+
+
+@contextmanager
+def timed(stage: str):
+    """
+    Time a block into the stage histogram and, inside a request, its Server-Timing entry.
+    Works around awaits too; costs two perf_counter calls and one histogram update.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, (time.perf_counter() - start) * 1000)
+
+
+def server_timing(timings: dict) -> str:
+    return ", ".join(f"{stage};dur={ms:.1f}" for stage, ms in timings.items())
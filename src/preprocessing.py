@@ -1,11 +1,45 @@
 import pandas as pd
 import os
 
+try:
+    from src.lexical import build_lexical_index, BM25_PATH
+except ImportError:
+    from lexical import build_lexical_index, BM25_PATH
+
 INPUT_PATH = "data/raw/shl_catalog_raw.csv"
+# Written by src/enrichment.py; its detail-page columns are joined onto the raw crawl when present
+ENRICHED_INPUT_PATH = "data/raw/shl_catalog_enriched.csv"
 OUTPUT_PATH = "data/processed/shl_catalog_clean.csv"
 
+# Kept in step with src/enrichment.py (not imported: it pulls in httpx and bs4)
+ENRICHED_COLUMNS = ["description", "duration", "skills", "job_levels", "languages"]
+
+
+def load_catalog(input_path=INPUT_PATH, enriched_path=ENRICHED_INPUT_PATH):
+    """
+    The raw crawl is the source of truth for which rows exist; enrichment columns are
+    left-joined onto it by url. A newer crawl therefore keeps its new rows and fields,
+    and rows the enrichment run has not seen yet simply have no detail fields.
+    """
+    df = pd.read_csv(input_path)
+    print(f"🔹 Preprocessing {input_path}")
+    if not os.path.exists(enriched_path):
+        return df
+
+    enriched = pd.read_csv(enriched_path)
+    columns = [c for c in ENRICHED_COLUMNS if c in enriched.columns]
+    enriched = enriched[["url"] + columns].drop_duplicates("url")
+    df = df.drop(columns=[c for c in columns if c in df.columns]).merge(enriched, on="url", how="left")
+
+    covered = df["url"].isin(enriched["url"]).sum()
+    print(f"🔹 Joined detail fields from {enriched_path} for {covered}/{len(df)} rows")
+    if covered < len(df):
+        print("⚠️ Some crawled rows have no detail fields; re-run src/enrichment.py to fill them in")
+    return df
+
+
 def preprocess():
-    df = pd.read_csv(INPUT_PATH)
+    df = load_catalog()
 
     df = df.rename(columns={
         "assessment_name": "assessment_name",
@@ -22,9 +56,25 @@ def preprocess():
         df["adaptive"]
     )
 
+    # Detail-page fields from the enrichment stage
+    if "description" in df.columns:
+        duration = pd.to_numeric(df["duration"], errors="coerce")
+        duration_text = duration.map(lambda m: f"{int(m)} minutes" if pd.notna(m) else "")
+        df["combined_text"] = (
+            df["combined_text"] + " " +
+            df["description"].fillna("") + " " +
+            df["skills"].fillna("") + " " +
+            df["job_levels"].fillna("") + " " +
+            duration_text
+        ).str.replace(r"\s+", " ", regex=True).str.strip()
+
     os.makedirs("data/processed", exist_ok=True)
     df.to_csv(OUTPUT_PATH, index=False)
     print(f"Saved cleaned data → {OUTPUT_PATH}")
 
+    # BM25 inverted index over combined_text, loaded alongside the embeddings
+    build_lexical_index(df["combined_text"].fillna("").tolist(), BM25_PATH)
+    print(f"Saved BM25 index → {BM25_PATH}")
+
 if __name__ == "__main__":
     preprocess()
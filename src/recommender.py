@@ -1,40 +1,67 @@
-import pickle
 import pandas as pd
-import torch
-from sentence_transformers import util, SentenceTransformer
 
-EMBEDDINGS_PATH = "data/processed/shl_embeddings.pkl"
-CATALOG_PATH = "data/processed/shl_catalog_clean.csv"
+try:
+    from src.embeddings import load_embeddings, encode_queries, get_index
+    from src.index import ExactIndex
+except ImportError:
+    from embeddings import load_embeddings, encode_queries, get_index
+    from index import ExactIndex
 
-# Load once
-model = SentenceTransformer("all-MiniLM-L6-v2")
-df_catalog = pd.read_csv(CATALOG_PATH)
+# Loaded once on first use (embeddings are memory-mapped from the shared store, re-encoded
+# only when the catalog changes); importing this module stays cheap
+_loaded = None
 
-with open(EMBEDDINGS_PATH, "rb") as f:
-    embeddings_data = pickle.load(f)
 
-# Extract embeddings from dict (if saved as dict) or use directly (if saved as array)
-if isinstance(embeddings_data, dict):
-    corpus_embeddings = embeddings_data["embeddings"]
-else:
-    corpus_embeddings = embeddings_data
+def load():
+    """
+    (df_catalog, model, corpus_embeddings, corpus_index), loaded on the first call
+    """
+    global _loaded
+    if _loaded is None:
+        df_catalog, model, corpus_embeddings = load_embeddings()
+        _loaded = (df_catalog, model, corpus_embeddings, get_index(corpus_embeddings))
+    return _loaded
+
+
+def __getattr__(name):
+    names = ("df_catalog", "model", "corpus_embeddings", "corpus_index")
+    if name in names:
+        return load()[names.index(name)]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# Convert to tensor if it's not already
-if not isinstance(corpus_embeddings, torch.Tensor):
-    corpus_embeddings = torch.tensor(corpus_embeddings)
+
+def recommend(query: str, df: pd.DataFrame, model, embeddings, top_k: int = 10, index=None) -> pd.DataFrame:
+    """
+    Returns the top_k catalog rows ranked by relevance, with a Score column
+    """
+    if index is None:
+        index = ExactIndex(embeddings)
+
+    query_embedding = encode_queries(model, query)
+
+    top_values, top_indices = index.search(query_embedding, k=top_k)
+    found = top_indices[0] >= 0
+
+    recs = df.iloc[top_indices[0][found].tolist()].copy()
+    recs["Score"] = top_values[0][found].tolist()
+    return recs
 
 
 def recommend_assessments(query: str, top_k: int = 10):
     """
     Returns list of assessment URLs ranked by relevance
     """
-    query_embedding = model.encode(query, convert_to_tensor=True)
+    df_catalog, model, corpus_embeddings, corpus_index = load()
+    recs = recommend(query, df_catalog, model, corpus_embeddings, top_k=top_k, index=corpus_index)
+    return recs["url"].tolist()
 
-    scores = util.cos_sim(query_embedding, corpus_embeddings)[0]
-    top_results = scores.topk(k=top_k)
 
-    recommendations = []
-    for idx in top_results.indices:
-        recommendations.append(df_catalog.iloc[int(idx)]["url"])
-
-    return recommendations
\ No newline at end of file
+def recommend_assessments_batch(queries, top_k: int = 10):
+    """
+    URL lists for many queries: one batched encode and one matrix search
+    """
+    df_catalog, model, _, corpus_index = load()
+    urls = df_catalog["url"].tolist()
+    query_embeddings = encode_queries(model, list(queries))
+    _, top_indices = corpus_index.search(query_embeddings, k=top_k)
+    return [[urls[i] for i in row if i >= 0] for row in top_indices.tolist()]
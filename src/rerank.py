@@ -0,0 +1,94 @@
+import os
+import time
+import numpy as np
+
+try:
+    from src.cache import TTLCache
+except ImportError:
+    from cache import TTLCache
+
+# Second stage: rerank the top-N bi-encoder hits with a small CPU cross-encoder
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "0") == "1"
+RERANK_MODEL_NAME = os.getenv("RERANK_MODEL_NAME", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "30"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+# Per-request budget; batches not started within it are skipped and keep their first-stage order
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "150"))
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "50000"))
+RERANK_CACHE_TTL_SECONDS = float(os.getenv("RERANK_CACHE_TTL_SECONDS", "86400"))
+
+
+class CrossEncoderReranker:
+    """
+    Scores (query, item text) pairs with a cross-encoder in batches, caching every
+    pair score. Scoring stops at the first batch boundary past the time budget;
+    whatever was scored is reranked and the rest is appended in its original order.
+    """
+
+    def __init__(self, model_name=RERANK_MODEL_NAME, top_n=RERANK_TOP_N, batch_size=RERANK_BATCH_SIZE, budget_ms=RERANK_BUDGET_MS, cache=None):
+        from sentence_transformers import CrossEncoder
+
+        self.model = CrossEncoder(model_name, device="cpu")
+        self.model_name = model_name
+        self.top_n = top_n
+        self.batch_size = batch_size
+        self.budget_ms = budget_ms
+        self.cache = cache if cache is not None else TTLCache(maxsize=RERANK_CACHE_SIZE, ttl=RERANK_CACHE_TTL_SECONDS)
+
+        self.requests = 0
+        self.pairs_scored = 0
+        self.truncated = 0
+
+    def rerank(self, query: str, indices, scores, texts, k=10, budget_ms=None):
+        """
+        Returns (indices, scores) of the best k after reranking the first top_n hits.
+        Reranked items carry cross-encoder scores; an unscored tail keeps first-stage scores.
+        """
+        budget = (self.budget_ms if budget_ms is None else budget_ms) / 1000
+        deadline = time.perf_counter() + budget
+        self.requests += 1
+
+        indices = np.asarray(indices)[:self.top_n].tolist()
+        first_stage = np.asarray(scores)[:self.top_n].tolist()
+
+        pair_scores = {}
+        pending = []
+        for i in indices:
+            cached = self.cache.get((query, texts[i]))
+            if cached is not None:
+                pair_scores[i] = cached
+            else:
+                pending.append(i)
+
+        for start in range(0, len(pending), self.batch_size):
+            if time.perf_counter() >= deadline:
+                self.truncated += 1
+                break
+            batch = pending[start:start + self.batch_size]
+            predicted = self.model.predict([(query, texts[i]) for i in batch], batch_size=self.batch_size)
+            for i, score in zip(batch, np.asarray(predicted, dtype=np.float32).tolist()):
+                pair_scores[i] = score
+                self.cache.put((query, texts[i]), score)
+            self.pairs_scored += len(batch)
+
+        reranked = sorted((i for i in indices if i in pair_scores), key=lambda i: pair_scores[i], reverse=True)
+        tail = [(i, s) for i, s in zip(indices, first_stage) if i not in pair_scores]
+
+        ranked = [(i, pair_scores[i]) for i in reranked] + tail
+        ranked = ranked[:k]
+        return (
+            np.array([i for i, _ in ranked], dtype=np.int64),
+            np.array([s for _, s in ranked], dtype=np.float32)
+        )
+
+    def stats(self) -> dict:
+        return {
+            "model": self.model_name,
+            "top_n": self.top_n,
+            "batch_size": self.batch_size,
+            "budget_ms": self.budget_ms,
+            "requests": self.requests,
+            "pairs_scored": self.pairs_scored,
+            "truncated": self.truncated,
+            "cache": self.cache.stats()
+        }
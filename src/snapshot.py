@@ -0,0 +1,140 @@
+import os
+import time
+import hashlib
+import threading
+
+# Poll the catalog file for changes every N seconds (0 = only reload through the admin endpoint)
+RELOAD_POLL_SECONDS = float(os.getenv("RELOAD_POLL_SECONDS", "0"))
+
+
+class CatalogSnapshot:
+    """
+    Everything derived from one catalog version: the frame, corpus texts, mapped
+    embeddings, retrieval / lexical indexes, filters and response records.
+    Never mutated after construction; a request takes one snapshot and uses it throughout.
+    """
+
+    def __init__(self, version, catalog_path, catalog_df, corpus, corpus_embeddings, corpus_index,
+                 lexical_index=None, catalog_filters=None, catalog_records=None):
+        self.version = version
+        self.catalog_path = catalog_path
+        self.catalog_df = catalog_df
+        self.corpus = corpus
+        self.corpus_embeddings = corpus_embeddings
+        self.corpus_index = corpus_index
+        self.lexical_index = lexical_index
+        self.catalog_filters = catalog_filters
+        self.catalog_records = catalog_records
+        self.loaded_at = time.time()
+
+    def info(self) -> dict:
+        return {
+            "version": self.version,
+            "catalog_path": self.catalog_path,
+            "rows": len(self.corpus),
+            "loaded_at": self.loaded_at
+        }
+
+
+def read_catalog_file(path):
+    """
+    (raw bytes, version) of the catalog file. The version hashes the whole file - every
+    column and the row order - so a refresh that only touches urls, ids, flags or
+    durations still produces a new snapshot. It is independent of the embedding-store
+    hash, which covers the corpus texts only.
+    """
+    with open(path, "rb") as f:
+        raw = f.read()
+    return raw, hashlib.sha256(raw).hexdigest()[:16]
+
+
+def file_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class SnapshotManager:
+    """
+    Holds the live snapshot behind a single reference. `reload()` builds and warms
+    a new snapshot off to the side with `load_fn()`, then swaps the reference;
+    requests already holding the old one finish on it, and it is freed when they drop it.
+    """
+
+    def __init__(self, load_fn, warm_fn=None, watch_path=None, poll_seconds=RELOAD_POLL_SECONDS):
+        self.load_fn = load_fn
+        self.warm_fn = warm_fn
+        self.watch_path = watch_path
+        self.poll_seconds = poll_seconds
+
+        self.current = None
+        self.reloads = 0
+        self.failures = 0
+        self.last_error = None
+
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._signature = None
+
+    def reload(self, force=False):
+        """
+        Returns (snapshot, swapped). A load or warm-up error leaves the current snapshot in place.
+        """
+        with self._reload_lock:
+            signature = file_signature(self.watch_path) if self.watch_path else None
+            try:
+                snapshot = self.load_fn()
+                if not force and self.current is not None and snapshot.version == self.current.version:
+                    self._signature = signature
+                    return self.current, False
+                if self.warm_fn is not None:
+                    self.warm_fn(snapshot)
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+                self._signature = signature
+                if self.current is None:
+                    raise
+                print(f"⚠️ Snapshot reload failed, keeping {self.current.version}: {e}")
+                return self.current, False
+
+            previous = self.current
+            self.current = snapshot
+            self._signature = signature
+            self.reloads += 1
+            self.last_error = None
+            print(f"✅ Snapshot {snapshot.version} live" + (f" (was {previous.version})" if previous else ""))
+            return snapshot, True
+
+    def start_watcher(self):
+        if self.poll_seconds <= 0 or not self.watch_path or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="snapshot-watcher", daemon=True)
+        self._thread.start()
+
+    def stop_watcher(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_seconds):
+            signature = file_signature(self.watch_path)
+            if signature is not None and signature != self._signature:
+                print(f"🔹 {self.watch_path} changed, reloading snapshot...")
+                self.reload()
+
+    def stats(self) -> dict:
+        return {
+            "current": self.current.info() if self.current is not None else None,
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "watching": self.watch_path if self._thread is not None else None,
+            "poll_seconds": self.poll_seconds
+        }
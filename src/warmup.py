@@ -0,0 +1,53 @@
+import time
+import threading
+from contextlib import contextmanager
+
+
+class WarmupTracker:
+    """
+    Named boot stages with their wall time, plus a readiness flag that is only
+    set once every stage has finished. Liveness never depends on it.
+    """
+
+    def __init__(self, name="service"):
+        self.name = name
+        self.started_at = time.perf_counter()
+        self.stages = {}
+        self.ready = False
+        self.error = None
+        self._event = threading.Event()
+
+    def record(self, stage: str, ms: float):
+        self.stages[stage] = round(ms, 1)
+        print(f"⏱️ [{self.name}] {stage}: {ms:.0f} ms")
+
+    @contextmanager
+    def stage(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, (time.perf_counter() - start) * 1000)
+
+    def mark_ready(self):
+        self.ready = True
+        self._event.set()
+        total = (time.perf_counter() - self.started_at) * 1000
+        print(f"✅ [{self.name}] ready after {total:.0f} ms: {self.stages}")
+
+    def mark_failed(self, error):
+        self.error = str(error)
+        self._event.set()
+        print(f"❌ [{self.name}] warm-up failed: {error}")
+
+    def wait(self, timeout=None) -> bool:
+        self._event.wait(timeout)
+        return self.ready
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "error": self.error,
+            "stages_ms": self.stages,
+            "total_ms": round(sum(self.stages.values()), 1)
+        }
@@ -0,0 +1,66 @@
+import threading
+
+import pytest
+
+from src.batching import MicroBatcher
+from src.inference import QueueFullError
+
+
+def test_queue_bound_counts_items():
+    started, release = threading.Event(), threading.Event()
+
+    def slow_batch(items):
+        started.set()
+        release.wait(5)
+        return items
+
+    batcher = MicroBatcher(slow_batch, max_batch_size=4, max_wait_ms=0, max_queue=8)
+    try:
+        # First item is taken by the batcher thread, which then blocks on it
+        first = batcher.submit(0)
+        assert started.wait(5)
+        futures = [batcher.submit(i) for i in range(1, 9)]
+        assert batcher.full()
+        with pytest.raises(QueueFullError):
+            batcher.submit(9)
+
+        release.set()
+        assert first.result(5) == 0
+        assert [f.result(5) for f in futures] == list(range(1, 9))
+        assert batcher.stats()["rejected"] == 1
+    finally:
+        release.set()
+        batcher.stop()
+
+
+def test_many_concurrent_items_are_admitted_by_default():
+    batcher = MicroBatcher(lambda items: [i * 2 for i in items], max_wait_ms=1)
+    try:
+        futures = [batcher.submit(i) for i in range(200)]
+        assert [f.result(5) for f in futures] == [i * 2 for i in range(200)]
+        assert batcher.stats()["rejected"] == 0
+    finally:
+        batcher.stop()
+
+
+def test_stop_with_full_queue_does_not_hang():
+    started, release = threading.Event(), threading.Event()
+
+    def slow_batch(items):
+        started.set()
+        release.wait(5)
+        return items
+
+    batcher = MicroBatcher(slow_batch, max_batch_size=2, max_wait_ms=0, max_queue=2)
+    batcher.submit(0)
+    assert started.wait(5)
+    futures = [batcher.submit(1), batcher.submit(2)]
+    assert batcher.full()
+
+    stopper = threading.Thread(target=batcher.stop)
+    stopper.start()
+    release.set()
+    stopper.join(5)
+    assert not stopper.is_alive()
+    # Items queued before stop() are still answered
+    assert [f.result(5) for f in futures] == [1, 2]
@@ -0,0 +1,55 @@
+import multiprocessing
+
+import pytest
+
+from src.cache import TTLCache
+
+
+def test_persistent_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    TTLCache(maxsize=4, ttl=60, persist_path=path).put("java", "java developer")
+
+    cache = TTLCache(maxsize=4, ttl=60, persist_path=path)
+    assert cache.get("java") == "java developer"
+    assert cache.stats()["persistent_hits"] == 1
+
+
+def _child_roundtrip(cache, queue):
+    try:
+        cache.put("child", "from child")
+        queue.put(cache.get("parent"))
+    except Exception as e:
+        queue.put(repr(e))
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork()")
+def test_forked_process_opens_its_own_connection(tmp_path):
+    # Created (and used) before the fork, like the rewrite cache under gunicorn preload
+    cache = TTLCache(maxsize=4, ttl=60, persist_path=str(tmp_path / "cache.sqlite"))
+    cache.put("parent", "from parent")
+    parent_db = cache._db
+
+    ctx = multiprocessing.get_context("fork")
+    queue = ctx.Queue()
+    child = ctx.Process(target=_child_roundtrip, args=(cache, queue))
+    child.start()
+    child.join(10)
+
+    assert queue.get(timeout=5) == "from parent"
+    assert cache._db is parent_db
+    cache._data.clear()
+    assert cache.get("child") == "from child"
+
+
+def test_memory_tier_never_waits_for_the_database(tmp_path):
+    cache = TTLCache(maxsize=4, ttl=60, persist_path=str(tmp_path / "cache.sqlite"))
+    expires_at = cache.put_memory("java", "java developer")
+
+    # Held by a slow SQLite commit elsewhere
+    with cache._db_lock:
+        assert cache.get_memory("java") == "java developer"
+        assert cache.get_memory("python") is None
+
+    cache.put_persistent("java", "java developer", expires_at)
+    assert TTLCache(maxsize=4, ttl=60, persist_path=str(tmp_path / "cache.sqlite")).get("java") == "java developer"
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 0
@@ -0,0 +1,99 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import src.index
+
+from src.embeddings import catalog_metadata, get_corpus_embeddings, get_index, load_metadata, read_manifest, store_dir
+
+MODEL_NAME = "test-model"
+
+
+class FakeModel:
+    """Deterministic stand-in for a SentenceTransformer: one vector per text"""
+
+    def __init__(self, dim=8):
+        self.dim = dim
+        self.calls = 0
+
+    def encode(self, texts, **kwargs):
+        self.calls += 1
+        return np.stack([
+            np.random.default_rng(abs(hash(text)) % (2 ** 32)).standard_normal(self.dim)
+            for text in texts
+        ]).astype(np.float32)
+
+
+def catalog(texts):
+    return pd.DataFrame({"id": [f"a{i}" for i in range(len(texts))], "assessment_name": texts})
+
+
+def test_index_builds_and_reloads_from_empty_store(tmp_path):
+    texts = [f"assessment {i}" for i in range(20)]
+    embeddings = get_corpus_embeddings(texts, model=FakeModel(), model_name=MODEL_NAME, metadata=catalog(texts), root=str(tmp_path))
+
+    index = get_index(embeddings, model_name=MODEL_NAME, kind="exact", root=str(tmp_path))
+    directory = store_dir(MODEL_NAME, str(tmp_path))
+    entry = read_manifest(directory)["index"]
+    assert entry["kind"] == "exact"
+    assert os.path.exists(os.path.join(directory, entry["file"]))
+
+    reloaded = get_index(embeddings, model_name=MODEL_NAME, kind="exact", root=str(tmp_path))
+    _, expected = index.search(embeddings[:3], k=5)
+    _, found = reloaded.search(embeddings[:3], k=5)
+    assert np.array_equal(expected, found)
+
+
+def test_incremental_update_keeps_index(tmp_path):
+    texts = [f"assessment {i}" for i in range(20)]
+    model = FakeModel()
+    embeddings = get_corpus_embeddings(texts, model=model, model_name=MODEL_NAME, metadata=catalog(texts), root=str(tmp_path))
+    get_index(embeddings, model_name=MODEL_NAME, kind="exact", root=str(tmp_path))
+
+    texts[3] = "assessment 3, revised"
+    embeddings = get_corpus_embeddings(texts, model=model, model_name=MODEL_NAME, metadata=catalog(texts), root=str(tmp_path))
+
+    manifest = read_manifest(store_dir(MODEL_NAME, str(tmp_path)))
+    assert manifest["last_update"]["changed"] == 1
+    assert manifest["last_update"]["reused"] == 19
+    assert manifest["index"]["catalog_hash"] == manifest["catalog_hash"]
+
+    _, top = get_index(embeddings, model_name=MODEL_NAME, kind="exact", root=str(tmp_path)).search(embeddings[3:4], k=1)
+    assert top[0][0] == 3
+
+
+def test_reload_keeps_catalog_metadata(tmp_path):
+    texts = [f"assessment {i}" for i in range(5)]
+    df = catalog(texts).assign(url=[f"https://example.com/{i}" for i in range(5)], combined_text=texts)
+    get_corpus_embeddings(texts, model=FakeModel(), model_name=MODEL_NAME, metadata=catalog_metadata(df), root=str(tmp_path))
+
+    # A hot reload with one edited row is matched by id and keeps the columnar metadata
+    texts[0] = "assessment 0, revised"
+    df["combined_text"] = texts
+    get_corpus_embeddings(texts, model=FakeModel(), model_name=MODEL_NAME, metadata=catalog_metadata(df), root=str(tmp_path))
+
+    directory = store_dir(MODEL_NAME, str(tmp_path))
+    manifest = read_manifest(directory)
+    stored = load_metadata(directory, manifest)
+    assert {"id", "assessment_name", "url", "row_hash"} <= set(stored.columns)
+    assert manifest["last_update"] == {"added": 0, "changed": 1, "deleted": 0, "reused": 4}
+    assert catalog_metadata(df[["combined_text"]]) is None
+
+
+def test_index_rebuilds_when_configuration_changes(tmp_path, monkeypatch):
+    texts = [f"assessment {i}" for i in range(64)]
+    embeddings = get_corpus_embeddings(texts, model=FakeModel(), model_name=MODEL_NAME, metadata=catalog(texts), root=str(tmp_path))
+    directory = store_dir(MODEL_NAME, str(tmp_path))
+
+    assert len(get_index(embeddings, model_name=MODEL_NAME, kind="ivf", root=str(tmp_path)).centroids) == 8
+    assert read_manifest(directory)["index"]["config"] == {"n_lists": 0}
+
+    # e.g. IVF_N_LISTS=4 set in the environment before a restart
+    monkeypatch.setattr(src.index, "IVF_N_LISTS", 4)
+    index = get_index(embeddings, model_name=MODEL_NAME, kind="ivf", root=str(tmp_path))
+    assert len(index.centroids) == 4
+    assert read_manifest(directory)["index"]["config"] == {"n_lists": 4}
+
+    # Unchanged settings reuse the persisted index
+    assert len(get_index(embeddings, model_name=MODEL_NAME, kind="ivf", root=str(tmp_path)).centroids) == 4
@@ -0,0 +1,72 @@
+import numpy as np
+
+from src.index import ExactIndex
+from src.lexical import BM25Index, hybrid_search
+
+TEXTS = [
+    "Java programming test",
+    "Python coding assessment",
+    "Accounts payable clerk simulation",
+    "Personality questionnaire for leaders",
+    "Verbal reasoning",
+    "Numerical reasoning",
+    "Sales role situational judgement",
+    "SQL server database skills",
+    "Customer service phone simulation",
+    "Management and leadership scenarios",
+    "Microsoft Excel 365",
+    "Typing speed",
+]
+
+
+def normalized(matrix):
+    return (matrix / np.linalg.norm(matrix, axis=1, keepdims=True)).astype(np.float32)
+
+
+def setup_indexes():
+    rng = np.random.default_rng(0)
+    embeddings = normalized(rng.standard_normal((len(TEXTS), 16)))
+    return embeddings, ExactIndex(embeddings), BM25Index.build(TEXTS)
+
+
+def test_hybrid_returns_k_rows_when_bm25_matches_fewer():
+    embeddings, dense_index, lexical_index = setup_indexes()
+    query = "accounts payable"
+    assert len(lexical_index.search(query, k=10)[0]) < 10
+
+    scores, indices = hybrid_search([query], embeddings[9:10], dense_index, lexical_index, k=10)
+    assert (indices[0] >= 0).sum() == 10
+    # The BM25 match and the best dense match (no shared words) both make it
+    assert 2 in indices[0].tolist()
+    assert 9 in indices[0].tolist()
+
+
+def test_hybrid_respects_mask():
+    embeddings, dense_index, lexical_index = setup_indexes()
+    mask = np.zeros(len(TEXTS), dtype=bool)
+    mask[[0, 1, 7]] = True
+
+    _, indices = hybrid_search(["accounts payable"], embeddings[2:3], dense_index, lexical_index, k=5, mask=mask)
+    found = indices[0][indices[0] >= 0].tolist()
+    assert sorted(found) == [0, 1, 7]
+
+
+class CountingIndex(ExactIndex):
+    searches = 0
+
+    def search(self, *args, **kwargs):
+        CountingIndex.searches += 1
+        return super().search(*args, **kwargs)
+
+
+def test_hybrid_scores_only_the_shortlist_when_it_fills_k():
+    embeddings, _, lexical_index = setup_indexes()
+    dense_index = CountingIndex(embeddings)
+    query = "reasoning simulation skills"
+    shortlist = set(lexical_index.search(query, k=100)[0].tolist())
+    assert len(shortlist) >= 3
+
+    _, indices = hybrid_search([query], embeddings[4:5], dense_index, lexical_index, k=3)
+    assert CountingIndex.searches == 0
+    assert set(indices[0].tolist()) <= shortlist
+    assert (indices[0] >= 0).sum() == 3
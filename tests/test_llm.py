@@ -0,0 +1,47 @@
+import asyncio
+import threading
+
+from src.cache import TTLCache
+from src.llm import AsyncLLMClient
+
+
+class EchoBackend:
+    def __init__(self):
+        self.calls = 0
+
+    async def generate(self, prompt):
+        self.calls += 1
+        return f" {prompt} "
+
+
+def test_persistent_cache_runs_off_the_event_loop(tmp_path):
+    path = str(tmp_path / "rewrites.sqlite")
+    cache = TTLCache(maxsize=8, ttl=60, persist_path=path)
+    backend = EchoBackend()
+    client = AsyncLLMClient(backend, prompt_fn=lambda q: q, cache=cache)
+
+    db_threads = set()
+    connection = cache._connection
+
+    def record_thread():
+        db_threads.add(threading.get_ident())
+        return connection()
+
+    cache._connection = record_thread
+
+    async def run():
+        loop_thread = threading.get_ident()
+        first = await client.rewrite("java")
+        await client.flush()
+        second = await client.rewrite("java")
+        return loop_thread, first, second
+
+    loop_thread, first, second = asyncio.run(run())
+    assert first == second == "java"
+    assert backend.calls == 1
+    assert db_threads and loop_thread not in db_threads
+
+    # The write-behind reached disk: a fresh process-level cache is served from SQLite
+    client = AsyncLLMClient(EchoBackend(), prompt_fn=lambda q: q, cache=TTLCache(maxsize=8, ttl=60, persist_path=path))
+    assert asyncio.run(client.rewrite("java")) == "java"
+    assert client.calls == 0
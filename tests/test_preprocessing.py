@@ -0,0 +1,35 @@
+import pandas as pd
+
+from src.preprocessing import load_catalog
+
+
+def test_enrichment_is_joined_onto_the_newer_crawl(tmp_path):
+    raw = tmp_path / "raw.csv"
+    enriched = tmp_path / "enriched.csv"
+    pd.DataFrame({
+        "url": ["/java", "/sql", "/new"],
+        "assessment_name": ["Java 8", "SQL", "New Test"],
+    }).to_csv(raw, index=False)
+    pd.DataFrame({
+        "url": ["/sql", "/java", "/removed"],
+        "assessment_name": ["SQL (old)", "Java (old)", "Removed"],
+        "description": ["queries", "jvm", "gone"],
+        "duration": [20, 30, 10],
+    }).to_csv(enriched, index=False)
+
+    df = load_catalog(str(raw), str(enriched))
+
+    # Rows and crawl fields come from the raw crawl, detail fields from the enrichment
+    assert df["url"].tolist() == ["/java", "/sql", "/new"]
+    assert df["assessment_name"].tolist() == ["Java 8", "SQL", "New Test"]
+    assert df["description"].tolist()[:2] == ["jvm", "queries"]
+    assert df["duration"].tolist()[:2] == [30, 20]
+    assert df["description"].isna().tolist()[2]
+
+
+def test_raw_crawl_alone_without_enrichment(tmp_path):
+    raw = tmp_path / "raw.csv"
+    pd.DataFrame({"url": ["/java"], "assessment_name": ["Java 8"]}).to_csv(raw, index=False)
+
+    df = load_catalog(str(raw), str(tmp_path / "missing.csv"))
+    assert list(df.columns) == ["url", "assessment_name"]
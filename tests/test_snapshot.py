@@ -0,0 +1,18 @@
+from src.snapshot import read_catalog_file
+
+
+def _write(path, text):
+    path.write_text(text)
+    return read_catalog_file(str(path))
+
+
+def test_version_covers_every_column_and_row_order(tmp_path):
+    path = tmp_path / "catalog.csv"
+    header = "name,url,duration\n"
+    raw, base = _write(path, header + "Java,/java,30\nSQL,/sql,20\n")
+    assert raw == path.read_bytes()
+
+    assert _write(path, header + "Java,/java,30\nSQL,/sql,20\n")[1] == base
+    assert _write(path, header + "Java,/java-new,30\nSQL,/sql,20\n")[1] != base
+    assert _write(path, header + "Java,/java,45\nSQL,/sql,20\n")[1] != base
+    assert _write(path, header + "SQL,/sql,20\nJava,/java,30\n")[1] != base